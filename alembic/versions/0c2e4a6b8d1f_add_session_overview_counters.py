@@ -0,0 +1,96 @@
+"""Add message counters and last-message preview to chat_sessions
+
+Revision ID: 0c2e4a6b8d1f
+Revises: f1a3c5e7b9d2
+Create Date: 2026-10-18 23:12:08.451902
+
+"""
+import json
+import zlib
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import sqlite
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c2e4a6b8d1f'
+down_revision: Union[str, Sequence[str], None] = 'f1a3c5e7b9d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Frozen copies of db/models.py (CreatedAt, MESSAGE_PREVIEW_CHARS, message_preview) at this revision
+CREATED_AT = sa.DateTime(timezone=True).with_variant(sqlite.DATETIME(truncate_microseconds=True), 'sqlite')
+PREVIEW_CHARS = 120
+BATCH = 1000
+
+
+def _preview(content: str) -> str:
+    text = " ".join(content.split())
+    return text if len(text) <= PREVIEW_CHARS else text[:PREVIEW_CHARS - 1] + "…"
+
+
+def _backfill() -> None:
+    bind = op.get_bind()
+
+    # Live messages: count and newest message per session
+    last = {}
+    rows = bind.execute(sa.text("""
+        SELECT m.session_id, c.n, m.role, m.content, m.created_at
+        FROM chat_messages m
+        JOIN (SELECT session_id, count(*) AS n, max(id) AS last_id FROM chat_messages GROUP BY session_id) c
+          ON c.last_id = m.id
+    """).columns(created_at=CREATED_AT))
+    for session_id, count, role, content, created_at in rows:
+        last[session_id] = [count, role, content, created_at]
+
+    # Archived messages (api/archive.py blobs: [[id, role, content, created_at], ...]); messages
+    # posted after archiving stayed live and are newer
+    for session_id, count, blob in bind.execute(sa.text(
+            "SELECT session_id, message_count, blob FROM chat_session_archives")):
+        _, role, content, created_at = json.loads(zlib.decompress(blob))[-1]
+        if session_id in last:
+            last[session_id][0] += count
+        else:
+            last[session_id] = [count, role, content, datetime.fromisoformat(created_at)]
+
+    update = sa.text("""
+        UPDATE chat_sessions
+        SET message_count = :count, last_message_preview = :preview, last_message_role = :role,
+            last_message_at = :at, last_activity_at = :at
+        WHERE id = :id
+    """).bindparams(sa.bindparam('at', type_=CREATED_AT))
+    params = [
+        {"id": session_id, "count": count, "preview": _preview(content), "role": role, "at": created_at}
+        for session_id, (count, role, content, created_at) in last.items()
+    ]
+    for offset in range(0, len(params), BATCH):
+        bind.execute(update, params[offset:offset + BATCH])
+    op.execute("UPDATE chat_sessions SET last_activity_at = created_at WHERE last_activity_at IS NULL")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_sessions', sa.Column('message_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('chat_sessions', sa.Column('last_message_preview', sa.String(), nullable=True))
+    op.add_column('chat_sessions', sa.Column('last_message_role', sa.String(), nullable=True))
+    op.add_column('chat_sessions', sa.Column('last_message_at', CREATED_AT, nullable=True))
+    op.add_column('chat_sessions', sa.Column('last_activity_at', CREATED_AT, nullable=True))
+    _backfill()
+    op.create_index(
+        'ix_chat_sessions_user_id_last_activity_at', 'chat_sessions',
+        ['user_id', 'last_activity_at', 'id'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chat_sessions_user_id_last_activity_at', table_name='chat_sessions')
+    # Plain DROP COLUMN, as in e7b9d1f3a5c2: no batch rebuild under the search triggers
+    op.drop_column('chat_sessions', 'last_activity_at')
+    op.drop_column('chat_sessions', 'last_message_at')
+    op.drop_column('chat_sessions', 'last_message_role')
+    op.drop_column('chat_sessions', 'last_message_preview')
+    op.drop_column('chat_sessions', 'message_count')
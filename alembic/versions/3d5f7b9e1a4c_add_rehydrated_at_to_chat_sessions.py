@@ -0,0 +1,29 @@
+"""Add rehydrated_at to chat_sessions
+
+Revision ID: 3d5f7b9e1a4c
+Revises: 0c2e4a6b8d1f
+Create Date: 2026-10-19 10:21:37.604118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d5f7b9e1a4c'
+down_revision: Union[str, Sequence[str], None] = '0c2e4a6b8d1f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_sessions', sa.Column('rehydrated_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Plain DROP COLUMN, as in e7b9d1f3a5c2: no batch rebuild under the search triggers
+    op.drop_column('chat_sessions', 'rehydrated_at')
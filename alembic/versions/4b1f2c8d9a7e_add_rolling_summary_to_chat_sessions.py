@@ -0,0 +1,30 @@
+"""Add rolling summary to chat sessions
+
+Revision ID: 4b1f2c8d9a7e
+Revises: 9e60e37f6dd3
+Create Date: 2026-10-18 10:12:04.318552
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b1f2c8d9a7e'
+down_revision: Union[str, Sequence[str], None] = '9e60e37f6dd3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_sessions', sa.Column('summary', sa.Text(), nullable=True))
+    op.add_column('chat_sessions', sa.Column('summary_upto_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_sessions', 'summary_upto_id')
+    op.drop_column('chat_sessions', 'summary')
@@ -0,0 +1,28 @@
+"""Add users created_at index for keyset pagination
+
+Revision ID: 5e8a0b3c1d24
+Revises: c3d5e7f90a12
+Create Date: 2026-10-18 11:40:19.227310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8a0b3c1d24'
+down_revision: Union[str, Sequence[str], None] = 'c3d5e7f90a12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_users_created_at', 'users', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_created_at', table_name='users')
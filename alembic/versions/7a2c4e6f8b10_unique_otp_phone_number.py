@@ -0,0 +1,39 @@
+"""One OTP row per phone number, index expires_at for cleanup
+
+Revision ID: 7a2c4e6f8b10
+Revises: 5e8a0b3c1d24
+Create Date: 2026-10-18 17:20:41.508112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a2c4e6f8b10'
+down_revision: Union[str, Sequence[str], None] = '5e8a0b3c1d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep only the newest code per phone before making the column unique
+    op.execute(
+        "DELETE FROM otp_codes WHERE id NOT IN "
+        "(SELECT MAX(id) FROM otp_codes GROUP BY phone_number)"
+    )
+    op.drop_index('ix_otp_codes_phone_number_expires_at', table_name='otp_codes')
+    op.drop_index('ix_otp_codes_phone_number', table_name='otp_codes')
+    op.create_index('ix_otp_codes_phone_number', 'otp_codes', ['phone_number'], unique=True)
+    op.create_index('ix_otp_codes_expires_at', 'otp_codes', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_otp_codes_expires_at', table_name='otp_codes')
+    op.drop_index('ix_otp_codes_phone_number', table_name='otp_codes')
+    op.create_index('ix_otp_codes_phone_number', 'otp_codes', ['phone_number'], unique=False)
+    op.create_index('ix_otp_codes_phone_number_expires_at', 'otp_codes', ['phone_number', 'expires_at'], unique=False)
@@ -0,0 +1,40 @@
+"""Add chat_session_archives cold storage and chat_sessions.archived_at
+
+Revision ID: b8d1f3a5c7e9
+Revises: 7a2c4e6f8b10
+Create Date: 2026-10-18 17:41:07.913254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d1f3a5c7e9'
+down_revision: Union[str, Sequence[str], None] = '7a2c4e6f8b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'chat_session_archives',
+        sa.Column('session_id', sa.Integer(), nullable=False),
+        sa.Column('message_count', sa.Integer(), nullable=False),
+        sa.Column('raw_bytes', sa.Integer(), nullable=False),
+        sa.Column('blob', sa.LargeBinary(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['session_id'], ['chat_sessions.id'], ),
+        sa.PrimaryKeyConstraint('session_id')
+    )
+    op.add_column('chat_sessions', sa.Column('archived_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('chat_sessions') as batch_op:
+        batch_op.drop_column('archived_at')
+    op.drop_table('chat_session_archives')
@@ -0,0 +1,32 @@
+"""Add composite indexes for chat hot queries
+
+Revision ID: c3d5e7f90a12
+Revises: 4b1f2c8d9a7e
+Create Date: 2026-10-18 11:02:47.905113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d5e7f90a12'
+down_revision: Union[str, Sequence[str], None] = '4b1f2c8d9a7e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_chat_messages_session_id_created_at', 'chat_messages', ['session_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_chat_sessions_user_id_created_at', 'chat_sessions', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_otp_codes_phone_number_expires_at', 'otp_codes', ['phone_number', 'expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_otp_codes_phone_number_expires_at', table_name='otp_codes')
+    op.drop_index('ix_chat_sessions_user_id_created_at', table_name='chat_sessions')
+    op.drop_index('ix_chat_messages_session_id_created_at', table_name='chat_messages')
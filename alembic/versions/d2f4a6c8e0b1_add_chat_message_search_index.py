@@ -0,0 +1,68 @@
+"""Add full-text search index on chat_messages.content
+
+Revision ID: d2f4a6c8e0b1
+Revises: b8d1f3a5c7e9
+Create Date: 2026-10-18 19:02:44.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f4a6c8e0b1'
+down_revision: Union[str, Sequence[str], None] = 'b8d1f3a5c7e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same DDL as db/models.py (SQLITE_SEARCH_DDL), frozen at this revision
+SQLITE_UPGRADE = (
+    """CREATE VIRTUAL TABLE chat_messages_fts USING fts5(
+        content, owner, tokenize="unicode61 remove_diacritics 2 categories 'L* N* Co M*'"
+    )""",
+    """CREATE TRIGGER chat_messages_fts_insert AFTER INSERT ON chat_messages BEGIN
+        INSERT INTO chat_messages_fts (rowid, content, owner)
+        SELECT new.id, new.content, 'u' || user_id FROM chat_sessions WHERE id = new.session_id;
+    END""",
+    """CREATE TRIGGER chat_messages_fts_delete AFTER DELETE ON chat_messages BEGIN
+        DELETE FROM chat_messages_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER chat_messages_fts_update AFTER UPDATE OF content ON chat_messages BEGIN
+        UPDATE chat_messages_fts SET content = new.content WHERE rowid = new.id;
+    END""",
+    # Index the existing messages
+    """INSERT INTO chat_messages_fts (rowid, content, owner)
+       SELECT m.id, m.content, 'u' || s.user_id FROM chat_messages m JOIN chat_sessions s ON s.id = m.session_id""",
+)
+
+SQLITE_DOWNGRADE = (
+    "DROP TRIGGER IF EXISTS chat_messages_fts_update",
+    "DROP TRIGGER IF EXISTS chat_messages_fts_delete",
+    "DROP TRIGGER IF EXISTS chat_messages_fts_insert",
+    "DROP TABLE IF EXISTS chat_messages_fts",
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_UPGRADE:
+            op.execute(statement)
+    elif dialect == 'postgresql':
+        op.create_index(
+            'ix_chat_messages_content_tsv', 'chat_messages',
+            [sa.text("to_tsvector('simple', content)")], unique=False, postgresql_using='gin'
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_DOWNGRADE:
+            op.execute(statement)
+    elif dialect == 'postgresql':
+        op.drop_index('ix_chat_messages_content_tsv', table_name='chat_messages')
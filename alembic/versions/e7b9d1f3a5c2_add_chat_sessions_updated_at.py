@@ -0,0 +1,30 @@
+"""Add chat_sessions.updated_at for conditional GET on the session list
+
+Revision ID: e7b9d1f3a5c2
+Revises: d2f4a6c8e0b1
+Create Date: 2026-10-18 20:15:32.604117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b9d1f3a5c2'
+down_revision: Union[str, Sequence[str], None] = 'd2f4a6c8e0b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_sessions', sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Plain DROP COLUMN (SQLite >= 3.35): a batch table rebuild would trip over the search
+    # trigger on chat_messages, which references chat_sessions
+    op.drop_column('chat_sessions', 'updated_at')
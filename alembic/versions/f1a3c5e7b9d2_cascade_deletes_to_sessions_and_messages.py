@@ -0,0 +1,75 @@
+"""Cascade deletes from users to sessions, messages and archives
+
+Revision ID: f1a3c5e7b9d2
+Revises: e7b9d1f3a5c2
+Create Date: 2026-10-18 22:04:51.337920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a3c5e7b9d2'
+down_revision: Union[str, Sequence[str], None] = 'e7b9d1f3a5c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, column, referred table). Postgres named these <table>_<column>_fkey; SQLite left them
+# unnamed, so the batch rebuild reflects them under the same name through NAMING_CONVENTION.
+FOREIGN_KEYS = (
+    ('chat_sessions', 'user_id', 'users'),
+    ('chat_messages', 'session_id', 'chat_sessions'),
+    ('chat_session_archives', 'session_id', 'chat_sessions'),
+)
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+# SQLite rebuilds the tables (copy, drop, rename). The search triggers on chat_messages
+# (d2f4a6c8e0b1) reference chat_sessions and would fail the rename, so they are dropped first
+# and recreated after; the FTS rows are keyed by message id, which the copy keeps.
+SQLITE_DROP_TRIGGERS = (
+    "DROP TRIGGER IF EXISTS chat_messages_fts_update",
+    "DROP TRIGGER IF EXISTS chat_messages_fts_delete",
+    "DROP TRIGGER IF EXISTS chat_messages_fts_insert",
+)
+SQLITE_CREATE_TRIGGERS = (
+    """CREATE TRIGGER chat_messages_fts_insert AFTER INSERT ON chat_messages BEGIN
+        INSERT INTO chat_messages_fts (rowid, content, owner)
+        SELECT new.id, new.content, 'u' || user_id FROM chat_sessions WHERE id = new.session_id;
+    END""",
+    """CREATE TRIGGER chat_messages_fts_delete AFTER DELETE ON chat_messages BEGIN
+        DELETE FROM chat_messages_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER chat_messages_fts_update AFTER UPDATE OF content ON chat_messages BEGIN
+        UPDATE chat_messages_fts SET content = new.content WHERE rowid = new.id;
+    END""",
+)
+
+
+def _replace_foreign_keys(ondelete) -> None:
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    if sqlite:
+        for statement in SQLITE_DROP_TRIGGERS:
+            op.execute(statement)
+
+    for table, column, referred in FOREIGN_KEYS:
+        name = f'{table}_{column}_fkey'
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+    if sqlite:
+        for statement in SQLITE_CREATE_TRIGGERS:
+            op.execute(statement)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _replace_foreign_keys(ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _replace_foreign_keys(ondelete=None)
@@ -0,0 +1,45 @@
+"""
+Opt-in cache of first-turn answers (ANSWER_CACHE_ENABLED=true).
+
+Many farmers open a session with the same question. Cacheable answers are generated from the
+profile's shared_instruction (api/profiles.py), which leaves out the farmer's name, so a reply
+never greets one farmer by another's name. The key combines the normalized question with the
+profile fields that instruction contains: the farm details, only when has_farm is 'yes'.
+"""
+import os
+import re
+
+from api import metrics
+from api.cache import TTLCache
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(24 * 60 * 60)))
+
+_cache = TTLCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL)
+
+answer_cache_requests = metrics.Counter("answer_cache_requests_total", "First-turn answer cache lookups by result")
+answer_cache_size = metrics.Gauge("answer_cache_entries", "Answers currently cached", fn=lambda: len(_cache))
+
+
+def normalize_question(text: str) -> str:
+    # Case, punctuation and spacing differences should not split the cache
+    text = re.sub(r'[^\w\s]', ' ', text.lower())
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def answer_key(question: str, user) -> tuple:
+    # Without a farm, build_system_instruction leaves the farm details out of the prompt
+    farm = (user.water_supply, user.farm_type) if user.has_farm == 'yes' else None
+    return normalize_question(question), farm
+
+
+def get(key: tuple):
+    answer = _cache.get(key)
+    answer_cache_requests.inc(result="hit" if answer is not None else "miss")
+    return answer
+
+
+def put(key: tuple, answer: str):
+    if answer:
+        _cache.set(key, answer)
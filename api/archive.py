@@ -0,0 +1,150 @@
+"""
+Hot/cold archival of inactive chat sessions.
+
+Sessions whose newest message (and last rehydration) is older than ARCHIVE_AFTER_DAYS have all
+their messages moved into chat_session_archives: one zlib-compressed JSON blob per session. The
+message rows are deleted, so chat_messages and its indexes only hold sessions that are still in use.
+
+Archived sessions are rehydrated on access: message ids and timestamps are restored exactly, so
+cursors, summary_upto_id and TTS cache keys stay valid. GET /chat/{session_id}/history and new chat
+turns do this transparently. Until then TTS lookups by message id do not find them; /export
+reads them from the blobs (api/export.py).
+
+    python -m api.archive [--older-than-days 30] [--batch 200] [--max-batches N]
+"""
+import argparse
+import json
+import os
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from api import metrics
+from db.models import ChatSession, ChatMessage, ChatSessionArchive
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH_SESSIONS = int(os.getenv("ARCHIVE_BATCH_SESSIONS", "200"))
+
+sessions_rehydrated = metrics.Counter("archive_sessions_rehydrated_total", "Archived sessions restored on access")
+
+
+def pack(messages) -> tuple[bytes, int]:
+    raw = json.dumps(
+        [[msg.id, msg.role, msg.content, msg.created_at.isoformat()] for msg in messages],
+        ensure_ascii=False
+    ).encode()
+    return zlib.compress(raw, 9), len(raw)
+
+
+def unpack(blob: bytes) -> list[dict]:
+    return [
+        {"id": msg_id, "role": role, "content": content, "created_at": datetime.fromisoformat(created_at)}
+        for msg_id, role, content, created_at in json.loads(zlib.decompress(blob))
+    ]
+
+
+def archive_batch(db: Session, cutoff: datetime, batch: int) -> dict:
+    """
+    Archives up to `batch` sessions with no message newer than `cutoff`, in one transaction.
+    A session rehydrated after `cutoff` was read recently and stays.
+    """
+    # SQLite gives a new row max(id) + 1: deleting the newest message would let the next one reuse
+    # an archived id, and that session's rehydrate would then collide with it. Its session stays.
+    newest_session = select(ChatMessage.session_id).order_by(ChatMessage.id.desc()).limit(1).scalar_subquery()
+    session_ids = db.execute(
+        select(ChatMessage.session_id)
+        .join(ChatSession, ChatSession.id == ChatMessage.session_id)
+        .where(ChatSession.archived_at.is_(None))
+        .where(or_(ChatSession.rehydrated_at.is_(None), ChatSession.rehydrated_at < cutoff))
+        .where(ChatMessage.session_id != newest_session)
+        .group_by(ChatMessage.session_id)
+        .having(func.max(ChatMessage.created_at) < cutoff)
+        .limit(batch)
+    ).scalars().all()
+
+    report = {"sessions": 0, "rows": 0, "raw_bytes": 0, "packed_bytes": 0}
+    now = datetime.now(timezone.utc)
+    for session_id in session_ids:
+        messages = db.execute(
+            select(ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.created_at)
+            .where(ChatMessage.session_id == session_id)
+            .order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc())
+        ).all()
+        blob, raw_bytes = pack(messages)
+
+        db.execute(insert(ChatSessionArchive).values(
+            session_id=session_id, message_count=len(messages), raw_bytes=raw_bytes, blob=blob
+        ))
+        # Only the packed rows: a message posted meanwhile stays live and is kept on rehydrate
+        db.execute(delete(ChatMessage).where(ChatMessage.id.in_([msg.id for msg in messages])))
+        db.execute(update(ChatSession).where(ChatSession.id == session_id).values(archived_at=now))
+
+        report["sessions"] += 1
+        report["rows"] += len(messages)
+        report["raw_bytes"] += raw_bytes
+        report["packed_bytes"] += len(blob)
+
+    db.commit()
+    return report
+
+
+def archive_inactive(db: Session, older_than_days: int = ARCHIVE_AFTER_DAYS,
+                     batch: int = ARCHIVE_BATCH_SESSIONS, max_batches: int = None) -> dict:
+    # created_at is stored as naive UTC (CURRENT_TIMESTAMP), so compare against naive UTC
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=older_than_days)
+    total = {"sessions": 0, "rows": 0, "raw_bytes": 0, "packed_bytes": 0, "batches": 0}
+    while max_batches is None or total["batches"] < max_batches:
+        report = archive_batch(db, cutoff, batch)
+        if not report["sessions"]:
+            break
+        total["batches"] += 1
+        for key, value in report.items():
+            total[key] += value
+    return total
+
+
+def rehydrate(db: Session, session_id: int) -> int:
+    """
+    Moves an archived session's messages back into chat_messages. Returns the number restored
+    (0 if the session was not archived, or another request restored it first).
+    """
+    archive = db.execute(
+        select(ChatSessionArchive.blob).where(ChatSessionArchive.session_id == session_id)
+    ).first()
+    if archive is None:
+        return 0
+
+    # Claim the archive row first: a concurrent rehydrate sees rowcount 0 and backs off
+    claimed = db.execute(delete(ChatSessionArchive).where(ChatSessionArchive.session_id == session_id)).rowcount
+    if not claimed:
+        db.rollback()
+        return 0
+
+    messages = unpack(archive.blob)
+    if messages:
+        db.execute(insert(ChatMessage), [dict(message, session_id=session_id) for message in messages])
+    db.execute(update(ChatSession).where(ChatSession.id == session_id).values(
+        archived_at=None, rehydrated_at=datetime.now(timezone.utc)
+    ))
+    db.commit()
+    sessions_rehydrated.inc()
+    return len(messages)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch", type=int, default=ARCHIVE_BATCH_SESSIONS, help="sessions per transaction")
+    parser.add_argument("--max-batches", type=int)
+    args = parser.parse_args()
+
+    from db.database import SessionLocal
+
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        result = archive_inactive(db, args.older_than_days, args.batch, args.max_batches)
+    result["elapsed_s"] = round(time.perf_counter() - start, 1)
+    print(json.dumps(result))
@@ -0,0 +1,71 @@
+"""
+In-process background jobs: a bounded asyncio queue served by a few worker tasks.
+
+Used by api/titles.py and api/context.py. Jobs are keyed (by session id): a key with a job queued
+or running is not queued again. The queue lives from start() to stop(), called from the app's
+lifespan; enqueueing never blocks, a full queue drops the job.
+"""
+import asyncio
+
+
+class BackgroundQueue:
+    def __init__(self, name: str, maxsize: int, workers: int, handle, on_error):
+        """
+        handle(*job) is awaited for each job; an exception it raises is passed to
+        on_error(job, error) and the worker moves on to the next job.
+        """
+        self.name = name
+        self.maxsize = maxsize
+        self.workers = workers
+        self._handle = handle
+        self._on_error = on_error
+        self._queue: asyncio.Queue = None
+        self._tasks = []
+        self._pending = set()
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    def qsize(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def put(self, key, *job) -> bool:
+        """
+        Queues job for key. True if it was queued or a job for key is already pending,
+        False if it was dropped (queue full or not running).
+        """
+        if self._queue is None:
+            return False
+        if key in self._pending:
+            return True
+        try:
+            self._queue.put_nowait((key, job))
+        except asyncio.QueueFull:
+            return False
+        self._pending.add(key)
+        return True
+
+    async def _worker(self):
+        while True:
+            key, job = await self._queue.get()
+            try:
+                await self._handle(*job)
+            except Exception as error:
+                self._on_error(job, error)
+            finally:
+                self._pending.discard(key)
+                self._queue.task_done()
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(), name=f"{self.name}-worker"))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._pending.clear()
+        self._queue = None
@@ -0,0 +1,166 @@
+"""
+Negotiated response compression for JSON (and plain text) responses.
+
+Brotli is used when the client accepts it and the optional `brotli` package is installed,
+gzip otherwise. Only COMPRESSIBLE_TYPES are touched: audio, the already gzipped /export stream
+and SSE (text/event-stream) pass through as they are. Bodies under COMPRESS_MIN_BYTES are not
+worth the CPU and are sent as is.
+
+Pure ASGI middleware, like api/timing.py: a streamed compressible body is compressed chunk by
+chunk and flushed after each one instead of being buffered.
+
+A compressed body is a different byte representation, so it gets its own ETag: "x" becomes
+"x-gzip" / "x-br". The endpoints keep producing the identity ETag; http_cache.etag_matches
+accepts either form. 304s carry Vary: Accept-Encoding and the ETag form the client asked about.
+"""
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "500"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/plain")
+CODINGS = ("br", "gzip")
+
+
+def coded_etag(etag: str, encoding: str) -> str:
+    # '"x"' -> '"x-gzip"', W/"x" -> W/"x-gzip"
+    return f'{etag[:-1]}-{encoding}"' if etag.endswith('"') else etag
+
+
+def negotiate(accept_encoding: str):
+    """
+    Picks "br", "gzip" or None from an Accept-Encoding header, honouring q=0.
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = quality
+
+    def allowed(coding):
+        return accepted.get(coding, accepted.get("*", 0.0)) > 0
+
+    if brotli is not None and allowed("br"):
+        return "br"
+    if allowed("gzip"):
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=COMPRESS_BROTLI_QUALITY)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)   # wbits=31: gzip container
+
+    def compress(self, data: bytes, last: bool) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(data) + (self._brotli.finish() if last else self._brotli.flush())
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = negotiate(request_headers.get("accept-encoding", ""))
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                if message["status"] == 304:
+                    passthrough = True
+                    await send(self._not_modified(message, encoding, request_headers.get("if-none-match", "")))
+                    return
+                headers = Headers(raw=message.get("headers", []))
+                media_type = headers.get("content-type", "").split(";")[0].strip()
+                if media_type not in COMPRESSIBLE_TYPES or "content-encoding" in headers:
+                    passthrough = True
+                    await send(message)
+                else:
+                    message["headers"] = list(message.get("headers", []))
+                    # Held back until the first body chunk shows whether compressing is worth it
+                    start_message = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if encoding is None or (not more_body and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = _Compressor(encoding)
+                headers["Content-Encoding"] = encoding
+                if "etag" in headers:
+                    headers["ETag"] = coded_etag(headers["etag"], encoding)
+                del headers["Content-Length"]
+                if not more_body:
+                    body = compressor.compress(body, last=True)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start_message)
+
+            await send({
+                "type": "http.response.body",
+                "body": compressor.compress(body, last=not more_body),
+                "more_body": more_body,
+            })
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    def _not_modified(message, encoding, if_none_match: str):
+        message["headers"] = list(message.get("headers", []))
+        headers = MutableHeaders(raw=message["headers"])
+        headers.add_vary_header("Accept-Encoding")
+        # Confirm the tag of the copy the client holds: the compressed one if that is what it sent
+        if encoding is not None and "etag" in headers:
+            coded = coded_etag(headers["etag"], encoding)
+            if coded.removeprefix("W/") in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+                headers["ETag"] = coded
+        return message
@@ -0,0 +1,181 @@
+"""
+Bounded conversation context for chat turns.
+
+Only the newest CONTEXT_MAX_MESSAGES messages that fit in CONTEXT_TOKEN_BUDGET are sent
+verbatim. Older messages are folded into ChatSession.summary by a background worker and
+sent as part of the system instruction, so prompt size stays flat as a session grows.
+"""
+import asyncio
+import os
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from api import llm, metrics
+from api.background import BackgroundQueue
+from db.database import SessionLocal
+from db.models import ChatSession, ChatMessage
+
+CONTEXT_MAX_MESSAGES = int(os.getenv("CONTEXT_MAX_MESSAGES", "20"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+
+SUMMARY_QUEUE_SIZE = int(os.getenv("SUMMARY_QUEUE_SIZE", "1000"))
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "2"))
+SUMMARY_BATCH_MESSAGES = int(os.getenv("SUMMARY_BATCH_MESSAGES", "40"))
+
+prompt_tokens = metrics.Histogram(
+    "chat_prompt_tokens", "Prompt tokens per chat request, from Gemini usage metadata",
+    buckets=(256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+)
+summaries_failed = metrics.Counter("summary_generation_failed_total", "Rolling summary updates that failed")
+summary_queue_depth = metrics.Gauge("summary_queue_depth", "Sessions waiting for a rolling summary update",
+                                    fn=lambda: _jobs.qsize())
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting; Gemini reports the real count
+    return len(text) // 4 + 1
+
+
+def record_prompt_tokens(response, route: str):
+    usage = getattr(response, "usage_metadata", None)
+    if usage and usage.prompt_token_count:
+        prompt_tokens.observe(usage.prompt_token_count, route=route)
+        return usage.prompt_token_count
+    return None
+
+
+def load_recent_history(db: Session, session: ChatSession):
+    """
+    Returns (chat_history, summarize_upto_id). summarize_upto_id is set when messages older than the
+    window are not yet covered by the summary; they should be folded in up to (not including) that id.
+    """
+    recent = db.query(ChatMessage) \
+        .filter(ChatMessage.session_id == session.id) \
+        .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()) \
+        .limit(CONTEXT_MAX_MESSAGES) \
+        .all()
+
+    # Newest first, stop at the token budget (the latest message is always sent)
+    window = []
+    used = 0
+    for msg in recent:
+        cost = estimate_tokens(msg.content)
+        if window and used + cost > CONTEXT_TOKEN_BUDGET:
+            break
+        window.append(msg)
+        used += cost
+    window.reverse()
+
+    # Gemini expects the conversation to open with a user turn
+    while len(window) > 1 and window[0].role != "user":
+        window.pop(0)
+
+    # Already imported: callers await llm.ensure_client() before loading the history
+    from google.genai import types
+
+    chat_history = []
+    for msg in window:
+        chat_history.append(types.Content(
+            role=msg.role,
+            parts=[types.Part.from_text(text=msg.content)]
+        ))
+
+    summarize_upto_id = None
+    if len(window) < len(recent) or len(recent) == CONTEXT_MAX_MESSAGES:
+        oldest_id = window[0].id
+        unsummarized = db.query(ChatMessage.id).filter(
+            ChatMessage.session_id == session.id,
+            ChatMessage.id < oldest_id,
+            ChatMessage.id > (session.summary_upto_id or 0)
+        ).first()
+        if unsummarized:
+            summarize_upto_id = oldest_id
+
+    return chat_history, summarize_upto_id
+
+
+def summary_instruction(summary: str) -> str:
+    if not summary:
+        return ""
+    return f"""
+    EARLIER IN THIS CONVERSATION (summary of older messages):
+    {summary}
+    """
+
+
+# --- Background rolling summary ---
+def enqueue_summary(session_id: int, upto_id: int):
+    # Dropped when the queue is full: not fatal, the next turn of this session will try again
+    _jobs.put(session_id, session_id, upto_id)
+
+
+def load_unsummarized(session_id: int, upto_id: int):
+    with SessionLocal() as db:
+        session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+        if not session:
+            return None, []
+        rows = db.query(ChatMessage.id, ChatMessage.role, ChatMessage.content).filter(
+            ChatMessage.session_id == session_id,
+            ChatMessage.id > (session.summary_upto_id or 0),
+            ChatMessage.id < upto_id
+        ).order_by(ChatMessage.id.asc()).limit(SUMMARY_BATCH_MESSAGES).all()
+        return session.summary, [tuple(row) for row in rows]
+
+
+def save_summary(session_id: int, summary: str, upto_id: int):
+    with SessionLocal() as db:
+        db.query(ChatSession).filter(ChatSession.id == session_id).update(
+            {"summary": summary, "summary_upto_id": upto_id}, synchronize_session=False
+        )
+        db.commit()
+
+
+async def generate_summary(summary: str, messages) -> str:
+    transcript = "\n".join(
+        f"{'Farmer' if role == 'user' else 'Advisor'}: {content}" for _, role, content in messages
+    )
+    prompt = f"""
+    You keep a running summary of a conversation between a farmer and an agricultural advisor.
+    Update the summary with the new messages below.
+    Keep every concrete fact the farmer shared (crops, location, land, water source, problems)
+    and every recommendation given (doses, dates, products). At most 200 words. Output only the summary.
+
+    CURRENT SUMMARY:
+    {summary or "(none)"}
+
+    NEW MESSAGES:
+    {transcript}
+    """
+
+    types = await llm.genai_types()
+    response = await llm.generate_content(
+        model="gemini-2.5-flash-lite",
+        contents=prompt,
+        config=types.GenerateContentConfig(max_output_tokens=400)
+    )
+    return (response.text or "").strip()
+
+
+async def _summarize_session(session_id: int, upto_id: int):
+    summary, messages = await run_in_threadpool(load_unsummarized, session_id, upto_id)
+    if not messages:
+        return
+    new_summary = await generate_summary(summary, messages)
+    if not new_summary:
+        summaries_failed.inc()
+        return
+    await run_in_threadpool(save_summary, session_id, new_summary, messages[-1][0])
+    if len(messages) == SUMMARY_BATCH_MESSAGES:
+        # More left to fold in: go again once this job is released
+        asyncio.get_running_loop().call_soon(enqueue_summary, session_id, upto_id)
+
+
+def _summary_failed(job, summary_error: Exception):
+    summaries_failed.inc()
+    print(f"Summary update failed for session {job[0]} ({summary_error}).")
+
+
+_jobs = BackgroundQueue("summary", SUMMARY_QUEUE_SIZE, SUMMARY_WORKERS, _summarize_session, _summary_failed)
+start = _jobs.start
+stop = _jobs.stop
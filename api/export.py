@@ -0,0 +1,255 @@
+"""
+Bulk export of chat_sessions / chat_messages as gzip-compressed NDJSON, in constant memory.
+
+Rows are read in (created_at, id) order with a server-side cursor (yield_per) and compressed
+as they go. The messages export then adds the archived sessions (api/archive.py), unpacked one
+blob at a time in session order, in the same record format. Every EXPORT_MEMBER_ROWS rows the
+current gzip member is closed with a checkpoint line
+
+    {"checkpoint": "<cursor>"}
+
+Concatenated gzip members are still one valid .gz file, so everything up to the last checkpoint
+can be decoded even if the transfer was cut. Passing that cursor back resumes right after it.
+
+Used by GET /export/{table} and from the command line:
+
+    python -m api.export messages --output messages.ndjson.gz [--user-id 7] [--since 2025-06-01] [--until ...]
+
+The CLI keeps <output>.checkpoint (file offset + cursor) and resumes from it when re-run.
+A session archived or rehydrated while an export runs can be written twice or missed; run exports
+outside the archive job, or dedupe on id.
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+import zlib
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session
+
+from api import archive
+from api.pagination import encode_cursor, decode_cursor
+from db.models import ChatSession, ChatMessage, ChatSessionArchive
+
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "1000"))
+EXPORT_MEMBER_ROWS = int(os.getenv("EXPORT_MEMBER_ROWS", "10000"))
+# Each archive row holds a whole session's messages
+EXPORT_BATCH_ARCHIVES = int(os.getenv("EXPORT_BATCH_ARCHIVES", "50"))
+
+# Checkpoints past the live rows: (session_id, message id) in the archived sessions
+ARCHIVED_CHECKPOINT_PREFIX = "archived."
+
+TABLES = {
+    "sessions": (ChatSession, (ChatSession.id, ChatSession.user_id, ChatSession.title,
+                               ChatSession.summary, ChatSession.created_at)),
+    "messages": (ChatMessage, (ChatMessage.id, ChatMessage.session_id, ChatSession.user_id,
+                               ChatMessage.role, ChatMessage.content, ChatMessage.created_at)),
+}
+
+
+def build_query(table: str, user_id: int = None, since: datetime = None, until: datetime = None, after=None):
+    model, columns = TABLES[table]
+    query = select(*columns)
+    if model is ChatMessage:
+        query = query.join(ChatSession, ChatMessage.session_id == ChatSession.id)
+
+    if user_id is not None:
+        query = query.where(ChatSession.user_id == user_id)
+    if since is not None:
+        query = query.where(model.created_at >= since)
+    if until is not None:
+        query = query.where(model.created_at < until)
+    if after is not None:
+        created_at, row_id = after
+        query = query.where(or_(
+            model.created_at > created_at,
+            and_(model.created_at == created_at, model.id > row_id)
+        ))
+    return query.order_by(model.created_at.asc(), model.id.asc())
+
+
+def build_archive_query(user_id: int = None, after_session_id: int = None):
+    query = (
+        select(ChatSessionArchive.session_id, ChatSession.user_id, ChatSessionArchive.blob)
+        .join(ChatSession, ChatSessionArchive.session_id == ChatSession.id)
+    )
+    if user_id is not None:
+        query = query.where(ChatSession.user_id == user_id)
+    if after_session_id is not None:
+        query = query.where(ChatSessionArchive.session_id >= after_session_id)
+    return query.order_by(ChatSessionArchive.session_id.asc())
+
+
+def _naive_utc(value: datetime) -> datetime:
+    # Archived timestamps are compared in Python: naive (SQLite) and aware (Postgres) alike
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def encode_checkpoint(last) -> str:
+    phase, key = last
+    if phase == "live":
+        return encode_cursor(*key)
+    raw = json.dumps(list(key)).encode()
+    return ARCHIVED_CHECKPOINT_PREFIX + base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_checkpoint(cursor: str):
+    """
+    ("live", (created_at, id)) or ("archived", (session_id, message id)) for a checkpoint cursor.
+    """
+    if not cursor.startswith(ARCHIVED_CHECKPOINT_PREFIX):
+        return "live", decode_cursor(cursor)
+    try:
+        encoded = cursor[len(ARCHIVED_CHECKPOINT_PREFIX):]
+        session_id, message_id = json.loads(base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+        return "archived", (int(session_id), int(message_id))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+class NdjsonGzipExport:
+    """
+    Iterates (gzip bytes, checkpoint cursor or None). The cursor is set on the chunk that
+    completes a gzip member; `rows` counts the rows written so far.
+    """
+
+    def __init__(self, db: Session, table: str, user_id: int = None, since: datetime = None,
+                 until: datetime = None, after=None):
+        """
+        `after` is a decoded checkpoint (see decode_checkpoint), or None to start from the beginning.
+        """
+        self.db = db
+        self.table = table
+        self.user_id = user_id
+        self.since = since
+        self.until = until
+        self.after = after
+        self.rows = 0
+
+    def records(self):
+        """
+        Yields (record, position); the position is what a checkpoint after that record encodes.
+        """
+        phase, after = self.after or ("live", None)
+        if phase == "live":
+            query = build_query(self.table, self.user_id, self.since, self.until, after)
+            for row in self.db.execute(query.execution_options(yield_per=EXPORT_BATCH_ROWS)):
+                record = row._asdict()
+                record["created_at"] = record["created_at"].isoformat()
+                yield record, ("live", (row.created_at, row.id))
+            after = None
+
+        if self.table == "messages":
+            yield from self.archived_records(after)
+
+    def archived_records(self, after=None):
+        since = _naive_utc(self.since) if self.since else None
+        until = _naive_utc(self.until) if self.until else None
+        query = build_archive_query(self.user_id, after[0] if after else None)
+        for row in self.db.execute(query.execution_options(yield_per=EXPORT_BATCH_ARCHIVES)):
+            for message in archive.unpack(row.blob):
+                if after and (row.session_id, message["id"]) <= after:
+                    continue
+                created_at = _naive_utc(message["created_at"])
+                if (since and created_at < since) or (until and created_at >= until):
+                    continue
+                record = {
+                    "id": message["id"], "session_id": row.session_id, "user_id": row.user_id,
+                    "role": message["role"], "content": message["content"],
+                    "created_at": message["created_at"].isoformat(),
+                }
+                yield record, ("archived", (row.session_id, message["id"]))
+
+    def __iter__(self):
+        compressor = None
+        in_member = 0
+        last = None
+
+        for record, position in self.records():
+            if compressor is None:
+                compressor = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits=31: gzip container
+            data = compressor.compress(json.dumps(record, ensure_ascii=False).encode() + b"\n")
+            if data:
+                yield data, None
+
+            self.rows += 1
+            in_member += 1
+            last = position
+            if in_member == EXPORT_MEMBER_ROWS:
+                yield self._close_member(compressor, last)
+                compressor = None
+                in_member = 0
+
+        if compressor is not None:
+            yield self._close_member(compressor, last)
+
+    @staticmethod
+    def _close_member(compressor, last):
+        cursor = encode_checkpoint(last)
+        line = json.dumps({"checkpoint": cursor}).encode() + b"\n"
+        return compressor.compress(line) + compressor.flush(), cursor
+
+
+# --- CLI ---
+def _read_checkpoint(path: str):
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+        return checkpoint["offset"], checkpoint["cursor"]
+    except FileNotFoundError:
+        return 0, None
+
+
+def _write_checkpoint(path: str, offset: int, cursor: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"offset": offset, "cursor": cursor}, f)
+    os.replace(tmp_path, path)
+
+
+def main(args):
+    from db.database import SessionLocal
+
+    checkpoint_path = f"{args.output}.checkpoint"
+    offset, cursor = (0, None) if args.restart else _read_checkpoint(checkpoint_path)
+    after = decode_checkpoint(cursor) if cursor else None
+
+    start = time.perf_counter()
+    # Drop anything written after the last complete member, then append
+    with open(args.output, "r+b" if offset else "wb") as out:
+        out.truncate(offset)
+        out.seek(offset)
+        with SessionLocal() as db:
+            export = NdjsonGzipExport(db, args.table, args.user_id, args.since, args.until, after)
+            for data, checkpoint in export:
+                out.write(data)
+                if checkpoint:
+                    out.flush()
+                    _write_checkpoint(checkpoint_path, out.tell(), checkpoint)
+        size = out.tell()
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    print(json.dumps({
+        "table": args.table,
+        "rows": export.rows,
+        "resumed_from": cursor,
+        "bytes": size,
+        "elapsed_s": round(time.perf_counter() - start, 1),
+    }), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("table", choices=sorted(TABLES))
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--user-id", type=int)
+    parser.add_argument("--since", type=datetime.fromisoformat, help="created_at >= (ISO date/time)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="created_at < (ISO date/time)")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    main(parser.parse_args())
@@ -0,0 +1,169 @@
+"""
+Conditional GET (ETag / Last-Modified -> 304) and byte ranges for the read endpoints.
+
+Validators come from one aggregate query over the rows a response is built from (row count,
+max id, max timestamp), never from hashing the serialized body, so a 304 skips loading and
+serializing the page. The page parameters (limit, cursor) are folded into the ETag because they
+select a different body.
+
+Compression (api/compression.py) suffixes the ETag of a compressed body with its coding and sets
+Vary: Accept-Encoding; validators here are always the identity form.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import HTTPException, Response
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from api.compression import CODINGS
+from db.models import ChatSession, ChatMessage
+
+# Clients must revalidate on every poll; the 304 is what saves the payload
+REVALIDATE = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def page_key(limit: int, cursor: str = None) -> str:
+    return hashlib.blake2s(f"{limit}:{cursor or ''}".encode(), digest_size=4).hexdigest()
+
+
+def identity_etag(tag: str) -> str:
+    # "x-gzip" / "x-br" (a compressed copy, see api/compression.py) -> "x"
+    for coding in CODINGS:
+        if tag.endswith(f'-{coding}"'):
+            return tag[:-len(coding) - 2] + '"'
+    return tag
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison: W/"x" matches "x", and so does a compressed copy's tag
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(identity_etag(tag.strip().removeprefix("W/")) == etag for tag in if_none_match.split(","))
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite returns CURRENT_TIMESTAMP values as naive UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(_as_utc(value).replace(microsecond=0), usegmt=True)
+
+
+def not_modified(etag: str, last_modified: datetime = None,
+                 if_none_match: str = None, if_modified_since: str = None) -> bool:
+    if if_none_match:
+        # Takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+        return etag_matches(if_none_match, etag)
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            return False
+        return _as_utc(last_modified).replace(microsecond=0) <= since
+    return False
+
+
+def validator_headers(etag: str, last_modified: datetime = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": REVALIDATE}
+    # Timestamps have one-second resolution: a Last-Modified from the current second could be
+    # followed by another change in that same second, so only send it once the second is over
+    if last_modified is not None and _as_utc(last_modified) < datetime.now(timezone.utc) - timedelta(seconds=1):
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def not_modified_response(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
+
+
+# --- Validators per resource ---
+# Synchronous, like the page queries they precede: the endpoints run both in one db.run_sync
+def history_validators(db: Session, session_id: int, limit: int, cursor: str = None):
+    """
+    (etag, last_modified) of GET /chat/{session_id}/history. Messages are only ever appended
+    (or removed with the session), so count + max id identify the history.
+    """
+    count, max_id, last_at = db.execute(
+        select(func.count(ChatMessage.id), func.max(ChatMessage.id), func.max(ChatMessage.created_at))
+        .where(ChatMessage.session_id == session_id)
+    ).one()
+    return make_etag("h", session_id, count, max_id or 0, page_key(limit, cursor)), last_at
+
+
+def sessions_validators(db: Session, user_id: int, limit: int, cursor: str = None) -> str:
+    """
+    ETag of GET /chat/sessions/{user_id}. No Last-Modified: a deleted session leaves no
+    newer timestamp behind, so a date alone cannot tell that the list shrank.
+    """
+    count, max_id, updated_at = db.execute(
+        select(func.count(ChatSession.id), func.max(ChatSession.id), func.max(ChatSession.updated_at))
+        .where(ChatSession.user_id == user_id)
+    ).one()
+    updated = int(_as_utc(updated_at).timestamp()) if updated_at else 0
+    return make_etag("s", user_id, count, max_id or 0, updated, page_key(limit, cursor))
+
+
+def overview_validators(db: Session, user_id: int, limit: int, cursor: str = None) -> str:
+    """
+    ETag of GET /chat/sessions/{user_id}/overview. Every new message bumps a session's
+    message_count, so the total tells a new message apart even within the same second.
+    """
+    count, max_id, messages, updated_at = db.execute(
+        select(func.count(ChatSession.id), func.max(ChatSession.id),
+               func.coalesce(func.sum(ChatSession.message_count), 0), func.max(ChatSession.updated_at))
+        .where(ChatSession.user_id == user_id)
+    ).one()
+    updated = int(_as_utc(updated_at).timestamp()) if updated_at else 0
+    return make_etag("o", user_id, count, max_id or 0, messages, updated, page_key(limit, cursor))
+
+
+# --- Byte ranges (audio) ---
+def byte_range(range_header: str, size: int):
+    """
+    Parses a single `bytes=` range into inclusive (start, end). Returns None to serve the whole
+    body (no or unsupported Range, e.g. several ranges) and raises 416 if it lies past the end.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    first, _, last = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start, end = int(first), int(last) if last else size - 1
+        else:
+            start, end = size - int(last), size - 1   # bytes=-N: the last N bytes
+    except ValueError:
+        return None
+    if first and last and end < start:
+        return None
+    start = max(start, 0)
+    if start >= size:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+
+def ranged_response(data: bytes, media_type: str, headers: dict, range_header: str = None,
+                    if_range: str = None) -> Response:
+    """
+    200 with the whole body, or 206 with the requested slice. If-Range with a stale ETag gets
+    the whole body, so a client never stitches together two versions.
+    """
+    headers = {**headers, "Accept-Ranges": "bytes"}
+    if if_range and if_range != headers.get("ETag"):
+        range_header = None
+    selected = byte_range(range_header, len(data))
+    if selected is None:
+        return Response(content=data, media_type=media_type, headers=headers)
+    start, end = selected
+    headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+    return Response(content=data[start:end + 1], status_code=206, media_type=media_type, headers=headers)
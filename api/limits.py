@@ -0,0 +1,153 @@
+"""
+Per-user token buckets for the Gemini-backed features (chat, title, tts).
+
+Each (scope, user_id) bucket holds up to BURST tokens and refills at PER_MIN tokens per
+minute; a request takes one token or is refused with the seconds until the next one.
+
+Bucket state lives in a pluggable backend (RATE_LIMIT_BACKEND):
+- memory: per worker process, the default for a single worker
+- sqlite: a small SQLite file (RATE_LIMIT_SQLITE_PATH) shared by every worker on the host
+
+Backends do blocking work; call enforce()/allow() from the threadpool.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from fastapi import HTTPException
+
+from api import metrics
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", "./rate_limits.db")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+
+class Limit(NamedTuple):
+    per_minute: float
+    burst: int
+
+
+def _limit(scope: str, per_minute: int, burst: int) -> Limit:
+    prefix = f"RATE_LIMIT_{scope.upper()}"
+    return Limit(float(os.getenv(f"{prefix}_PER_MIN", str(per_minute))), int(os.getenv(f"{prefix}_BURST", str(burst))))
+
+
+LIMITS = {
+    "chat": _limit("chat", 20, 10),
+    "title": _limit("title", 10, 5),
+    "tts": _limit("tts", 30, 10),
+}
+
+rate_limited = metrics.Counter("rate_limited_total", "Requests refused by the per-user rate limiter, by scope")
+
+
+def _take(tokens, updated_at, limit: Limit, now: float):
+    """
+    Refills the bucket and takes one token. Returns (tokens left, seconds to wait; 0 if allowed).
+    """
+    rate = limit.per_minute / 60
+    if tokens is None:
+        tokens = float(limit.burst)
+    else:
+        tokens = min(float(limit.burst), tokens + (now - updated_at) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+class MemoryBackend:
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()   # key -> (tokens, updated_at), least recently used first
+        self._lock = threading.Lock()
+
+    def take(self, key: str, limit: Limit, now: float) -> float:
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (None, None))
+            tokens, wait = _take(tokens, updated_at, limit, now)
+            self._buckets[key] = (tokens, now)
+            # An evicted bucket simply starts full again
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class SQLiteBackend:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, limit: Limit, now: float) -> float:
+        conn = self._connection()
+        # IMMEDIATE takes the write lock up front, so concurrent workers cannot both spend the last token
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)).fetchone()
+            tokens, wait = _take(row[0] if row else None, row[1] if row else None, limit, now)
+            conn.execute(
+                "INSERT INTO rate_limit_buckets (key, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (key, tokens, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+def _create_backend():
+    if RATE_LIMIT_BACKEND == "memory":
+        return MemoryBackend(RATE_LIMIT_MAX_KEYS)
+    if RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteBackend(RATE_LIMIT_SQLITE_PATH)
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {RATE_LIMIT_BACKEND}")
+
+
+backend = _create_backend() if RATE_LIMIT_ENABLED else None
+
+
+def retry_after(scope: str, user_id: int) -> float:
+    """
+    Takes a token from the user's bucket for `scope`. Returns 0 if allowed, else seconds to wait.
+    """
+    limit = LIMITS[scope]
+    if backend is None or limit.per_minute <= 0:
+        return 0.0
+    wait = backend.take(f"{scope}:{user_id}", limit, time.time())
+    if wait:
+        rate_limited.inc(scope=scope)
+    return wait
+
+
+def allow(scope: str, user_id: int) -> bool:
+    return retry_after(scope, user_id) == 0
+
+
+def enforce(scope: str, user_id: int):
+    wait = retry_after(scope, user_id)
+    if wait:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many {scope} requests, try again later",
+            headers={"Retry-After": str(math.ceil(wait))}
+        )
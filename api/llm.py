@@ -0,0 +1,366 @@
+import asyncio
+import math
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+import anyio
+import httpx
+
+from api import metrics, timing
+
+load_dotenv()
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+# Max Gemini calls in flight per worker. Calls beyond this wait on the semaphore
+# instead of holding a threadpool slot.
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "256"))
+# Admission control: at most GEMINI_MAX_QUEUE calls may wait for a slot, each for at most
+# GEMINI_QUEUE_TIMEOUT seconds. Beyond that, calls fail fast with Overloaded.
+GEMINI_MAX_QUEUE = int(os.getenv("GEMINI_MAX_QUEUE", "512"))
+GEMINI_QUEUE_TIMEOUT = float(os.getenv("GEMINI_QUEUE_TIMEOUT", "30"))
+GEMINI_RETRY_AFTER = int(os.getenv("GEMINI_RETRY_AFTER", "5"))
+
+# Resilience: per-attempt deadline, retries with jittered exponential backoff on transient
+# errors, a per-model circuit breaker, and a fallback model for the text models.
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "30"))
+GEMINI_RETRIES = int(os.getenv("GEMINI_RETRIES", "2"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "0.5"))
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "8"))
+GEMINI_CIRCUIT_THRESHOLD = int(os.getenv("GEMINI_CIRCUIT_THRESHOLD", "5"))
+GEMINI_CIRCUIT_RESET = float(os.getenv("GEMINI_CIRCUIT_RESET", "30"))
+GEMINI_FALLBACK_MODEL = os.getenv("GEMINI_FALLBACK_MODEL", "gemini-2.5-flash-lite")
+
+# The google-genai SDK takes most of a second to import and the client a little more to build,
+# so neither happens at import time: start() builds the client in a thread once the worker is up,
+# and the first call waits for it if it is not there yet. Benchmarks assign a fake here.
+client = None
+_client_lock = threading.Lock()
+
+_warmup = None
+
+_semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+_waiting = 0
+
+llm_latency = metrics.Histogram("llm_request_duration_seconds", "Gemini call latency by model and result (streams: until the last chunk)")
+llm_tokens = metrics.Counter("llm_tokens_total", "Gemini tokens by model and kind (input, output, thinking)")
+llm_rejected = metrics.Counter("llm_admission_rejected_total", "Gemini calls refused by admission control, by reason")
+llm_queue_depth = metrics.Gauge("llm_queue_depth", "Gemini calls waiting for a concurrency slot", fn=lambda: _waiting)
+llm_retries = metrics.Counter("llm_retries_total", "Gemini calls retried after a transient error, by model")
+llm_fallbacks = metrics.Counter("llm_fallbacks_total", "Gemini calls answered by the fallback model, by primary model")
+llm_circuit_opened = metrics.Counter("llm_circuit_opened_total", "Times a model's circuit breaker opened")
+
+
+class Overloaded(Exception):
+    """
+    Raised when a Gemini call cannot be admitted; the API answers 503 with Retry-After.
+    """
+
+    def __init__(self, retry_after: int = GEMINI_RETRY_AFTER):
+        super().__init__("Gemini capacity exhausted")
+        self.retry_after = retry_after
+
+
+class CircuitOpen(Overloaded):
+    """
+    Raised without calling Gemini while every candidate model's circuit breaker is open.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(retry_after)
+        self.args = ("Gemini circuit breaker open",)
+
+
+class CircuitBreaker:
+    """
+    Opens after GEMINI_CIRCUIT_THRESHOLD consecutive transient failures. After GEMINI_CIRCUIT_RESET
+    seconds one trial call is let through (half-open): success closes it, failure re-opens it.
+    Only touched from the event loop, so no lock.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at >= GEMINI_CIRCUIT_RESET:
+            # Restart the clock so only one trial goes through per reset period
+            self.opened_at = time.monotonic()
+            self._trial = True
+            return True
+        return False
+
+    def retry_after(self) -> int:
+        if self.opened_at is None:
+            return 0
+        return max(1, math.ceil(GEMINI_CIRCUIT_RESET - (time.monotonic() - self.opened_at)))
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial or self.failures >= GEMINI_CIRCUIT_THRESHOLD:
+            if self.opened_at is None:
+                llm_circuit_opened.inc(model=self.model)
+            self.opened_at = time.monotonic()
+            self._trial = False
+
+
+_breakers = {}
+
+
+def _breaker(model: str) -> CircuitBreaker:
+    breaker = _breakers.get(model)
+    if breaker is None:
+        breaker = _breakers[model] = CircuitBreaker(model)
+    return breaker
+
+
+def get_client():
+    """
+    Returns the shared genai.Client, creating it on first use. Blocking: call it from a thread.
+    """
+    global client
+    with _client_lock:
+        if client is None:
+            from google import genai
+            client = genai.Client(api_key=GEMINI_API_KEY)
+    return client
+
+
+async def ensure_client():
+    if client is not None:
+        return client
+    return await anyio.to_thread.run_sync(get_client)
+
+
+async def genai_types():
+    """
+    The google.genai.types module, for building requests. Awaits the SDK import like the client.
+    """
+    await ensure_client()
+    from google.genai import types
+    return types
+
+
+async def start():
+    # Returns right away: the client is built in the background while the worker already serves
+    # requests (GET /ready reports when it is done)
+    global _warmup
+    _warmup = asyncio.create_task(ensure_client())
+
+
+def is_ready() -> bool:
+    return client is not None
+
+
+def is_transient(error: Exception) -> bool:
+    from google.genai import errors
+
+    if isinstance(error, (TimeoutError, httpx.TransportError)):
+        return True
+    if isinstance(error, errors.APIError):
+        return error.code in (408, 429) or (error.code or 0) >= 500
+    return False
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter: uniform in [0, base * 2^attempt], capped
+    return random.uniform(0, min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_BASE * 2 ** attempt))
+
+
+def _candidates(model: str, config):
+    """
+    (model, config) pairs to try in order: the requested model, then the fallback for text models.
+    """
+    candidates = [(model, config)]
+    if GEMINI_FALLBACK_MODEL and model != GEMINI_FALLBACK_MODEL and "tts" not in model:
+        # thinking_level is a Gemini 3 setting; the 2.5 fallback rejects it
+        fallback_config = config.model_copy(update={"thinking_config": None}) if config is not None else None
+        candidates.append((GEMINI_FALLBACK_MODEL, fallback_config))
+    return candidates
+
+
+def check_capacity():
+    """
+    Fails fast if a new call would be refused, so handlers can reject before doing any work.
+    """
+    if _semaphore.locked() and _waiting >= GEMINI_MAX_QUEUE:
+        llm_rejected.inc(reason="queue_full")
+        raise Overloaded()
+
+
+@asynccontextmanager
+async def _admit():
+    global _waiting
+    check_capacity()
+    _waiting += 1
+    try:
+        async with asyncio.timeout(GEMINI_QUEUE_TIMEOUT):
+            await _semaphore.acquire()
+    except TimeoutError:
+        llm_rejected.inc(reason="timeout")
+        raise Overloaded()
+    finally:
+        _waiting -= 1
+    try:
+        yield
+    finally:
+        _semaphore.release()
+
+
+def _record_call(model: str, start: float, result: str, response=None):
+    elapsed = time.perf_counter() - start
+    llm_latency.observe(elapsed, model=model, result=result)
+    timing.record("llm", elapsed)
+
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        for kind, count in (("input", usage.prompt_token_count),
+                            ("output", usage.candidates_token_count),
+                            ("thinking", usage.thoughts_token_count)):
+            if count:
+                llm_tokens.inc(count, model=model, kind=kind)
+
+
+async def _generate_once(model: str, contents, config, timeout: float):
+    async with _admit():
+        gemini = await ensure_client()
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout(timeout):
+                response = await gemini.aio.models.generate_content(
+                    model=model,
+                    contents=contents,
+                    config=config
+                )
+        except Exception:
+            _record_call(model, start, "error")
+            raise
+        _record_call(model, start, "ok", response)
+        return response
+
+
+async def _stream_once(model: str, contents, config, timeout: float):
+    async with _admit():
+        gemini = await ensure_client()
+        start = time.perf_counter()
+        last_chunk = None
+        result = "error"
+        try:
+            # The deadline applies to the first chunk and to every gap between chunks
+            async with asyncio.timeout(timeout):
+                stream = await gemini.aio.models.generate_content_stream(
+                    model=model,
+                    contents=contents,
+                    config=config
+                )
+            while True:
+                try:
+                    async with asyncio.timeout(timeout):
+                        chunk = await anext(stream)
+                except StopAsyncIteration:
+                    break
+                last_chunk = chunk
+                yield chunk
+            result = "ok"
+        except (GeneratorExit, asyncio.CancelledError):
+            result = "cancelled"
+            raise
+        finally:
+            # Usage metadata is complete on the final chunk
+            _record_call(model, start, result, last_chunk if result == "ok" else None)
+
+
+async def generate_content(model: str, contents, config=None, timeout: float = None):
+    """
+    Non-blocking wrapper around client.aio.models.generate_content, capped by GEMINI_MAX_CONCURRENCY.
+
+    Each attempt gets `timeout` seconds (GEMINI_TIMEOUT). Transient errors are retried with
+    jittered backoff; a timeout or exhausted retries move on to GEMINI_FALLBACK_MODEL.
+    Raises Overloaded when the call cannot be admitted, CircuitOpen when every model is tripped.
+    """
+    last_error = None
+    for attempt_model, attempt_config in _candidates(model, config):
+        breaker = _breaker(attempt_model)
+        for attempt in range(GEMINI_RETRIES + 1):
+            if not breaker.allow():
+                last_error = last_error or CircuitOpen(breaker.retry_after())
+                break
+            try:
+                response = await _generate_once(attempt_model, contents, attempt_config, timeout or GEMINI_TIMEOUT)
+            except Overloaded:
+                raise
+            except Exception as error:
+                if not is_transient(error):
+                    # Gemini answered (e.g. a 400), so it is up
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                last_error = error
+                # A slow model is better skipped than retried
+                if isinstance(error, TimeoutError) or attempt == GEMINI_RETRIES:
+                    break
+                llm_retries.inc(model=attempt_model)
+                await asyncio.sleep(_backoff(attempt))
+                continue
+
+            breaker.record_success()
+            if attempt_model != model:
+                llm_fallbacks.inc(model=model)
+            return response
+    raise last_error
+
+
+async def generate_content_stream(model: str, contents, config=None, timeout: float = None):
+    """
+    Async generator over client.aio.models.generate_content_stream chunks.
+    Holds a concurrency slot until the stream is exhausted or closed.
+
+    Retries and fallback work as in generate_content, but only until the first chunk has been
+    yielded; a failure after that is raised to the caller.
+    """
+    last_error = None
+    for attempt_model, attempt_config in _candidates(model, config):
+        breaker = _breaker(attempt_model)
+        for attempt in range(GEMINI_RETRIES + 1):
+            if not breaker.allow():
+                last_error = last_error or CircuitOpen(breaker.retry_after())
+                break
+            started = False
+            try:
+                async for chunk in _stream_once(attempt_model, contents, attempt_config, timeout or GEMINI_TIMEOUT):
+                    if not started and attempt_model != model:
+                        llm_fallbacks.inc(model=model)
+                    started = True
+                    yield chunk
+            except Overloaded:
+                raise
+            except Exception as error:
+                if not is_transient(error):
+                    # Gemini answered (e.g. a 400), so it is up
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                if started:
+                    raise
+                last_error = error
+                if isinstance(error, TimeoutError) or attempt == GEMINI_RETRIES:
+                    break
+                llm_retries.inc(model=attempt_model)
+                await asyncio.sleep(_backoff(attempt))
+                continue
+
+            breaker.record_success()
+            return
+    raise last_error
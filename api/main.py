@@ -1,62 +1,75 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Form, Response
+from fastapi import FastAPI, Depends, HTTPException, status, Form, Response, Header, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from contextlib import asynccontextmanager
+from sqlalchemy import delete, select, text
 from sqlalchemy.orm import Session
-from datetime import timedelta
+from datetime import datetime
 import random
 import os
-from dotenv import load_dotenv
-import re
-import base64
-import io
-import wave
-
-# Google GenAI Imports
-from google import genai
-from google.genai import types
-from google.genai.types import HarmCategory, HarmBlockThreshold
+import json
+import anyio
 
 # Local Imports
 from db import models
-from db.database import engine, get_db
-from db.models import User, OTP, ChatSession, ChatMessage, get_ist_time
-from api import schemas
-
-# Create DB Tables
-models.Base.metadata.create_all(bind=engine)
+from db.database import DB_AUTO_CREATE, engine, endpoint_engine, get_db, SessionLocal, AsyncSessionLocal, EndpointSession, pool_status
+from db.models import User, ChatSession, ChatMessage
+from api import schemas, llm, limits, otp_store, export, archive, search, compression, http_cache, serialization, answer_cache, metrics, profiles, timing, titles, tts, tts_cache, context, pagination
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Tables come from `alembic upgrade head`; creating them here is opt-in (see db/database.py)
+    if DB_AUTO_CREATE:
+        await run_in_threadpool(models.Base.metadata.create_all, engine)
+    await llm.start()
+    await titles.start()
+    await context.start()
+    await otp_store.start()
+    yield
+    await otp_store.stop()
+    await context.stop()
+    await titles.stop()
+
+
+app = FastAPI(title="Farmer Chatbot API", lifespan=lifespan)
+app.add_middleware(compression.CompressionMiddleware)
+app.add_middleware(timing.TimingMiddleware)
+timing.instrument_engine(engine)
+if endpoint_engine is not engine:
+    timing.instrument_engine(endpoint_engine)
+
+
+@app.exception_handler(llm.Overloaded)
+async def gemini_overloaded(request, exc: llm.Overloaded):
+    # Admission control refused the Gemini call (see api/llm.py): ask the client to back off
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "AI Service busy, try again shortly"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
-app = FastAPI(title="Farmer Chatbot API")
+# Keep the partial reply when a streamed answer is cut off (client dropped or Gemini failed)
+STREAM_SAVE_PARTIAL = os.getenv("CHAT_STREAM_SAVE_PARTIAL", "true").lower() == "true"
 
-load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-client = genai.Client(api_key=GEMINI_API_KEY)
+# /export/{table} is only served to callers sending this value in X-Export-Token (disabled when unset)
+EXPORT_TOKEN = os.getenv("EXPORT_TOKEN")
 
 # --- 1. Send OTP Endpoint (No Code in Response) ---
 @app.post("/auth/send-otp")
-def send_otp(request: schemas.PhoneSchema, db: Session = Depends(get_db)):
+def send_otp(request: schemas.PhoneSchema):
     phone = request.phone_number
 
-    # Delete old OTPs
-    db.query(OTP).filter(OTP.phone_number == phone).delete()
-    db.commit()
-
-    # Generate OTP (Stored in DB but NOT returned in response)
+    # Generate OTP (stored, NOT returned in response). A new code replaces the old one;
+    # expired codes are swept in the background (see api/otp_store.py).
     otp_code = f"{random.randint(100000, 999999)}"
-    expiration_time = get_ist_time() + timedelta(minutes=5)
-
-    new_otp = OTP(
-        phone_number=phone,
-        otp_code=otp_code,
-        expires_at=expiration_time,
-        is_used=False
-    )
-    db.add(new_otp)
-    db.commit()
+    otp_store.store.put(phone, otp_code)
 
     return {"message": "OTP sent successfully"}
 
 
 # --- 2. Verify OTP Endpoint (BYPASS MODE) ---
 @app.post("/auth/verify-otp")
-def verify_otp(request: schemas.VerifyOTPSchema, db: Session = Depends(get_db)):
+async def verify_otp(request: schemas.VerifyOTPSchema, db: EndpointSession = Depends(get_db)):
     otp = request.otp.strip()
 
     # --- VALIDATION RULES ---
@@ -75,7 +88,7 @@ def verify_otp(request: schemas.VerifyOTPSchema, db: Session = Depends(get_db)):
     # bypass below
 
     # Check if user exists
-    user = db.query(User).filter(User.phone_number == request.phone_number).first()
+    user = await db.scalar(select(User).where(User.phone_number == request.phone_number))
 
     if not user:
         # Create new user -> Set verified to TRUE
@@ -84,8 +97,7 @@ def verify_otp(request: schemas.VerifyOTPSchema, db: Session = Depends(get_db)):
             is_verified=True
         )
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await db.commit()
         return {"message": "User created and logged in", "user_id": new_user.id, "status": "New User"}
 
     return {"message": "Login successful", "user_id": user.id, "status": "Existing User"}
@@ -93,15 +105,15 @@ def verify_otp(request: schemas.VerifyOTPSchema, db: Session = Depends(get_db)):
 
 # --- 3. Update User Profile (Form Data - No Image) ---
 @app.put("/users/update/{user_id}")
-def update_user(
+async def update_user(
         user_id: int,
         full_name: str = Form(None),
         has_farm: str = Form(None),      # yes/no
         water_supply: str = Form(None),  # rain, well, river, channel
         farm_type: str = Form(None),     # Koradvahu, bagayati
-        db: Session = Depends(get_db)
+        db: EndpointSession = Depends(get_db)
 ):
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.scalar(select(User).where(User.id == user_id))
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -119,346 +131,670 @@ def update_user(
     if farm_type:
         user.farm_type = farm_type
 
-    db.commit()
+    await db.commit()
+    profiles.invalidate_user(user_id)
     return {"message": "Profile updated successfully"}
 
 
 # --- 4. Read Single User ---
 @app.get("/users/{user_id}", response_model=schemas.UserResponse)
-def read_single_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def read_single_user(user_id: int, db: EndpointSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.id == user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 # --- 5. Read All Users ---
 @app.get("/users", response_model=list[schemas.UserResponse])
-def read_all_users(db: Session = Depends(get_db)):
-    users = db.query(User).all()
-    return users
+async def read_all_users(
+        limit: int = pagination.PageLimit,
+        cursor: str = None,
+        db: EndpointSession = Depends(get_db)
+):
+    # Columns of UserResponse only, encoded directly (see api/serialization.py)
+    query = select(*serialization.columns(User, schemas.UserResponse))
+    users, next_cursor = await db.run_sync(pagination.paginate, query, User, limit, cursor)
+    response = serialization.json_rows(users)
+    pagination.set_next_cursor(response, next_cursor)
+    return response
 
 # --- 6. Delete User ---
 @app.delete("/users/{user_id}")
-def delete_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+async def delete_user(user_id: int, db: EndpointSession = Depends(get_db)):
+    if await db.scalar(select(User.id).where(User.id == user_id)) is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    db.delete(user)
-    db.commit()
-    return {"message": "User deleted successfully"}
+    # Sessions, messages and archives go with the user (ON DELETE CASCADE), so the statement
+    # count does not grow with the history. Only what the caches need is read beforehand.
+    session_ids = (await db.scalars(select(ChatSession.id).where(ChatSession.user_id == user_id))).all()
+    cache_keys = await db.run_sync(
+        tts_cache_keys_of, select(ChatMessage.content).join(ChatSession).where(ChatSession.user_id == user_id)
+    )
 
+    await db.execute(delete(User).where(User.id == user_id).execution_options(synchronize_session=False))
+    await db.commit()
 
-# --- HELPER: SYSTEM INSTRUCTIONS  ---
-def build_system_instruction(user: User):
-    """
-    Creates a tailored persona for the AI based on the specific farmer's profile.
-    """
-    profile_context = f"""
-    FARMER PROFILE:
-    - Name: {user.full_name}
-    - Has Farm: {user.has_farm}
-    - Water Supply: {user.water_supply}
-    - Farm Type: {user.farm_type}
-    """
+    profiles.invalidate_user(user_id, session_ids)
+
+    tts_cache.audio_cache.invalidate(cache_keys)
+    return {"message": "User deleted successfully"}
 
-    return f"""
-    You are an expert Indian Agricultural AI Advisor (Kisan Mitra). 
-    
-    YOUR GOAL: Provide specific, actionable, and region-aware farming advice.
-    
-    CONTEXT:
-    {profile_context if user.has_farm == 'yes' else "User is interested in farming but details are incomplete."}
-    
-    GUIDELINES:
-    1. STRICTLY AVOID GENERIC DATES. If asked about sowing/harvesting, DO NOT say "June to July". 
-       Instead, ask for the user's District/State if you don't know it, then give specific windows like "First 2 weeks of June for [Region Name]".
-    2. USE FARMER'S CONTEXT: If they have 'well' water, suggest irrigation methods suitable for wells.
-    3. LANGUAGE: Answer in the same language the user asks (mostly Hinglish or English).
-    4. TONE: Professional, respectful, yet simple (like an experienced agronomist).
-    5. FORMATTING: Use bullet points for steps.
-    """
 
 # --- 7. Create New Chat Session ---
 @app.post("/chat/sessions", response_model=schemas.SessionResponse)
-def create_chat_session(
+async def create_chat_session(
         request: schemas.CreateSessionSchema,
         user_id: int,
-        db: Session = Depends(get_db)
+        db: EndpointSession = Depends(get_db)
 ):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    if await db.scalar(select(User.id).where(User.id == user_id)) is None:
         raise HTTPException(status_code=404, detail="User not found")
 
     new_session = ChatSession(
-        user_id=user.id,
+        user_id=user_id,
         title=request.title
     )
     db.add(new_session)
-    db.commit()
-    db.refresh(new_session)
+    await db.commit()
+    await db.refresh(new_session)
+    profiles.remember_owner(new_session.id, user_id)
     return new_session
 
-# --- 8. Get All Sessions for User ---
-@app.get("/chat/sessions/{user_id}", response_model=list[schemas.SessionResponse])
-def get_user_sessions(user_id: int, db: Session = Depends(get_db)):
-    sessions = db.query(ChatSession).filter(ChatSession.user_id == user_id).order_by(ChatSession.created_at.desc()).all()
-    return sessions
+# --- HELPER: DB work for the polled lists ---
+# Validator query and page query as one unit of work through db.run_sync, like a chat turn
+# below. The rows are None when the client's copy is current (304).
+def load_sessions_page(db: Session, user_id: int, limit: int, cursor: str, if_none_match: str):
+    headers = http_cache.validator_headers(http_cache.sessions_validators(db, user_id, limit, cursor))
+    if http_cache.not_modified(headers["ETag"], if_none_match=if_none_match):
+        return headers, None, None
+
+    # Newest first; X-Next-Cursor continues with older sessions
+    query = (
+        select(*serialization.columns(ChatSession, schemas.SessionResponse))
+        .where(ChatSession.user_id == user_id)
+    )
+    return headers, *pagination.paginate(db, query, ChatSession, limit, cursor, descending=True)
 
 
-# --- 9. Send Message & Get Response ---
-@app.post("/chat/{session_id}/message", response_model=schemas.MessageResponse)
-def chat_with_gemini(
-        session_id: int,
-        request: schemas.MessageCreateSchema,
+def load_overview_page(db: Session, user_id: int, limit: int, cursor: str, if_none_match: str):
+    headers = http_cache.validator_headers(http_cache.overview_validators(db, user_id, limit, cursor))
+    if http_cache.not_modified(headers["ETag"], if_none_match=if_none_match):
+        return headers, None, None
+
+    query = (
+        select(*serialization.columns(ChatSession, schemas.SessionOverviewResponse))
+        .where(ChatSession.user_id == user_id)
+    )
+    return headers, *pagination.paginate(
+        db, query, ChatSession, limit, cursor, descending=True, key=ChatSession.last_activity_at
+    )
+
+
+# --- 8. Get All Sessions for User ---
+@app.get("/chat/sessions/{user_id}", response_model=list[schemas.SessionResponse])
+async def get_user_sessions(
         user_id: int,
-        db: Session = Depends(get_db)
+        limit: int = pagination.PageLimit,
+        cursor: str = None,
+        if_none_match: str = Header(None),
+        db: EndpointSession = Depends(get_db)
 ):
+    # Polled by the app: unchanged lists get a 304 (see api/http_cache.py)
+    headers, sessions, next_cursor = await db.run_sync(load_sessions_page, user_id, limit, cursor, if_none_match)
+    if sessions is None:
+        return http_cache.not_modified_response(headers)
+
+    response = serialization.json_rows(sessions, headers)
+    pagination.set_next_cursor(response, next_cursor)
+    return response
+
+# --- 8a. Session Overview (home screen: preview and counts per session) ---
+@app.get("/chat/sessions/{user_id}/overview", response_model=list[schemas.SessionOverviewResponse])
+async def get_sessions_overview(
+        user_id: int,
+        limit: int = pagination.PageLimit,
+        cursor: str = None,
+        if_none_match: str = Header(None),
+        db: EndpointSession = Depends(get_db)
+):
+    """
+    Sessions with their last message preview, message count and last activity, most recently
+    active first. Read from counters kept on chat_sessions (see db/models.py): one query per page,
+    no per-session history requests.
+    """
+    headers, sessions, next_cursor = await db.run_sync(load_overview_page, user_id, limit, cursor, if_none_match)
+    if sessions is None:
+        return http_cache.not_modified_response(headers)
+
+    response = serialization.json_rows(sessions, headers)
+    pagination.set_next_cursor(response, next_cursor)
+    return response
+
+
+# --- HELPER: DB work for a chat turn ---
+# One unit of work, run through db.run_sync: a single threadpool hop on SQLite (see
+# db/database.py). The helpers shared with the background workers are synchronous as well.
+def load_chat_turn(db: Session, session_id: int, user_id: int, content: str):
     # 1. Validate Session
-    session = db.query(ChatSession).filter(ChatSession.id == session_id, ChatSession.user_id == user_id).first()
+    session = db.scalar(
+        select(ChatSession).where(ChatSession.id == session_id, ChatSession.user_id == user_id)
+    )
     if not session:
         raise HTTPException(status_code=404, detail="Session not found or access denied")
 
+    if session.archived_at is not None:
+        archive.rehydrate(db, session.id)
+
+    profiles.remember_owner(session.id, user_id)
+    user = profiles.get_profile(db, user_id)
+
+    # Opening questions repeat a lot across farmers; those can be served from api/answer_cache.py
+    answer_key = None
+    if answer_cache.ANSWER_CACHE_ENABLED:
+        first_message = db.scalar(select(ChatMessage.id).where(ChatMessage.session_id == session.id).limit(1))
+        if first_message is None:
+            answer_key = answer_cache.answer_key(content, user)
+
     # 2. Save User Message
-    user_msg = ChatMessage(session_id=session.id, role="user", content=request.content)
+    user_msg = ChatMessage(session_id=session.id, role="user", content=content)
     db.add(user_msg)
-    db.commit()
+    # Flushed, not committed: the commit below covers it
+    db.flush()
 
-    # 3. Retrieve History
-    history_objs = db.query(ChatMessage) \
-        .filter(ChatMessage.session_id == session.id) \
-        .order_by(ChatMessage.created_at.asc()) \
-        .all()
+    # 3. Retrieve History (last N turns verbatim, older ones via the rolling summary)
+    chat_history, summarize_upto_id = context.load_recent_history(db, session)
 
-    chat_history = []
-    for msg in history_objs:
-        chat_history.append(types.Content(
-            role=msg.role,
-            parts=[types.Part.from_text(text=msg.content)]
-        ))
+    # 4. Prepare Context (the profile part is prebuilt, see api/profiles.py). A cacheable answer is
+    # replayed to other farmers, so it is generated without this farmer's name.
+    instruction = user.shared_instruction if answer_key else user.system_instruction
+    system_instruction = instruction + context.summary_instruction(session.summary)
+    current_title = session.title
 
-    # 4. Prepare Context
-    user = session.user
-    system_instruction = build_system_instruction(user)
+    # Commit the user message and end the transaction so the pooled connection is not held while we await Gemini
+    db.commit()
 
-    # 5. Call Gemini API (Main Chat)
-    try:
-        generate_config = types.GenerateContentConfig(
-            system_instruction=system_instruction,
-            temperature=0.7,
-            thinking_config={
-                "thinking_level": "LOW"
-            }
-        )
+    return chat_history, system_instruction, current_title, summarize_upto_id, answer_key
 
-        response = client.models.generate_content(
-            model="gemini-3-flash-preview",
-            contents=chat_history,
-            config=generate_config
-        )
 
-        ai_text = response.text
+async def prepare_chat_turn(db: EndpointSession, session_id: int, user_id: int, content: str):
+    await run_in_threadpool(limits.enforce, "chat", user_id)
+    turn = await db.run_sync(load_chat_turn, session_id, user_id, content)
+    # The SDK is imported in a thread if this worker has not loaded it yet (see api/llm.py)
+    await llm.ensure_client()
+    return turn
 
-    except Exception as e:
-        print(f"Gemini API Error: {e}")
-        raise HTTPException(status_code=500, detail="AI Service Unavailable")
 
-    # 6. Save AI Response
-    ai_msg = ChatMessage(session_id=session.id, role="model", content=ai_text)
-    db.add(ai_msg)
+def save_chat_message(db: Session, session_id: int, role: str, content: str):
+    msg = ChatMessage(session_id=session_id, role=role, content=content)
+    db.add(msg)
     db.commit()
-    db.refresh(ai_msg)
+    db.refresh(msg)
+    return msg
 
 
+def build_chat_config(system_instruction: str):
+    from google.genai import types
 
-    current_title = session.title
-    defaults = ["New Consultation", "New Chat", "string"]
+    return types.GenerateContentConfig(
+        system_instruction=system_instruction,
+        temperature=0.7,
+        thinking_config={
+            "thinking_level": "LOW"
+        }
+    )
 
-    if not current_title or current_title.strip() == "" or current_title in defaults:
-        try:
 
-            title_prompt = f"""
-            Summarize this into a 3-5 word title. 
-            RULES:
-            1. Do NOT use numbering (e.g., no "1.", no "-").
-            2. Do NOT use quotes.
-            3. Just output the raw words.
-            
-            Query: {request.content}
-            """
-
-            title_response = client.models.generate_content(
-                model="gemini-2.5-flash-lite",
-                contents=title_prompt,
-                config=types.GenerateContentConfig(max_output_tokens=20)
+# --- 9. Send Message & Get Response ---
+@app.post("/chat/{session_id}/message", response_model=schemas.MessageResponse)
+async def chat_with_gemini(
+        session_id: int,
+        request: schemas.MessageCreateSchema,
+        user_id: int,
+        http_response: Response,
+        db: EndpointSession = Depends(get_db)
+):
+    # Refuse up front when Gemini is saturated, before the user message is saved
+    llm.check_capacity()
+
+    # 1-4. Validate session, save user message, load history and profile
+    chat_history, system_instruction, current_title, summarize_upto_id, answer_key = await prepare_chat_turn(
+        db, session_id, user_id, request.content
+    )
+    if summarize_upto_id:
+        context.enqueue_summary(session_id, summarize_upto_id)
+
+    ai_text = answer_cache.get(answer_key) if answer_key else None
+
+    # 5. Call Gemini API (Main Chat)
+    if ai_text is None:
+        try:
+            response = await llm.generate_content(
+                model="gemini-3-flash-preview",
+                contents=chat_history,
+                config=build_chat_config(system_instruction)
             )
 
-            new_title = ""
-            if title_response.text:
-                new_title = title_response.text.strip()
-            elif title_response.candidates and title_response.candidates[0].content.parts:
-                new_title = title_response.candidates[0].content.parts[0].text.strip()
+            ai_text = response.text
+
+        except llm.Overloaded:
+            raise
+        except Exception as e:
+            print(f"Gemini API Error: {e}")
+            raise HTTPException(status_code=500, detail="AI Service Unavailable")
+
+        prompt_tokens = context.record_prompt_tokens(response, route="message")
+        if prompt_tokens:
+            http_response.headers["X-Prompt-Tokens"] = str(prompt_tokens)
+        if answer_key:
+            answer_cache.put(answer_key, ai_text)
 
-            if new_title:
-                # REGEX CLEANUP: Removes "1.", "1)", "- ", "* " from the start
-                new_title = re.sub(r'^[\d\.\-\*\s]+', '', new_title)
+    # 6. Save AI Response
+    ai_msg = await db.run_sync(save_chat_message, session_id, "model", ai_text)
 
-                # Remove quotes
-                new_title = new_title.replace('"', '').replace("'", "").strip()
 
-                session.title = new_title
-                db.commit()
-                print(f"Auto-updated session title to: {new_title}")
 
-        except Exception as title_error:
-            print(f"Title generation failed ({title_error}). Keeping default title.")
+    # 7. Auto-title in the background (see api/titles.py)
+    if titles.needs_title(current_title):
+        titles.enqueue(session_id, user_id, request.content)
 
     return ai_msg
 
+# --- HELPER: Server-Sent Events ---
+def sse_event(data: dict, event: str = None) -> str:
+    payload = f"data: {json.dumps(data)}\n\n"
+    return f"event: {event}\n{payload}" if event else payload
+
+
+async def save_streamed_reply(session_id: int, content: str) -> dict:
+    # Own session: the stream outlives the request's dependencies
+    async with AsyncSessionLocal() as db:
+        msg = await db.run_sync(save_chat_message, session_id, "model", content)
+        return schemas.MessageResponse.model_validate(msg).model_dump(mode="json")
+
+
+# --- 9a. Send Message & Stream Response (SSE) ---
+@app.post("/chat/{session_id}/message/stream")
+async def stream_chat_with_gemini(
+        session_id: int,
+        request: schemas.MessageCreateSchema,
+        user_id: int,
+        db: EndpointSession = Depends(get_db)
+):
+    """
+    Same as /chat/{session_id}/message, but tokens are sent as SSE `data: {"delta": ...}` events
+    as Gemini produces them. The saved message is sent last as an `event: done`.
+    """
+    llm.check_capacity()
+    chat_history, system_instruction, current_title, summarize_upto_id, answer_key = await prepare_chat_turn(
+        db, session_id, user_id, request.content
+    )
+    if summarize_upto_id:
+        context.enqueue_summary(session_id, summarize_upto_id)
+
+    cached_text = answer_cache.get(answer_key) if answer_key else None
+
+    async def gemini_chunks():
+        if cached_text is not None:
+            # Cached answer goes out as a single delta
+            from google.genai import types
+
+            yield types.GenerateContentResponse(
+                candidates=[types.Candidate(content=types.Content(
+                    role="model", parts=[types.Part.from_text(text=cached_text)]
+                ))]
+            )
+            return
+        async for chunk in llm.generate_content_stream(
+                model="gemini-3-flash-preview",
+                contents=chat_history,
+                config=build_chat_config(system_instruction)
+        ):
+            yield chunk
+
+    async def event_stream():
+        parts = []
+        completed = False
+        try:
+            async for chunk in gemini_chunks():
+                last_chunk = chunk
+                if chunk.text:
+                    parts.append(chunk.text)
+                    yield sse_event({"delta": chunk.text})
+            completed = bool(parts)
+            if completed and cached_text is None:
+                # Usage metadata is complete on the final chunk
+                context.record_prompt_tokens(last_chunk, route="message_stream")
+                if answer_key:
+                    answer_cache.put(answer_key, "".join(parts))
+            if not completed:
+                yield sse_event({"detail": "AI Service Unavailable"}, event="error")
+        except Exception as e:
+            print(f"Gemini API Error: {e}")
+            yield sse_event({"detail": "AI Service Unavailable"}, event="error")
+        finally:
+            # Client dropped or Gemini failed mid-stream: keep the text the farmer already saw
+            if not completed and parts and STREAM_SAVE_PARTIAL:
+                with anyio.CancelScope(shield=True):
+                    await save_streamed_reply(session_id, "".join(parts))
+
+        if not completed:
+            return
+
+        ai_msg = await save_streamed_reply(session_id, "".join(parts))
+        yield sse_event(ai_msg, event="done")
+
+        if titles.needs_title(current_title):
+            titles.enqueue(session_id, user_id, request.content)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# --- HELPER: DB work for a history page (one unit of work, see load_sessions_page) ---
+def load_history_page(db: Session, session_id: int, user_id: int, limit: int, cursor: str,
+                      if_none_match: str, if_modified_since: str):
+    if not profiles.owns_session(db, session_id, user_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    # Inactive session moved to cold storage (api/archive.py), possibly with messages posted since:
+    # restore it before reading, so every page (and the ETag) covers the whole history
+    if db.scalar(select(ChatSession.archived_at).where(ChatSession.id == session_id)) is not None:
+        archive.rehydrate(db, session_id)
+
+    # Polled by the app: an unchanged history gets a 304 (see api/http_cache.py)
+    etag, last_modified = http_cache.history_validators(db, session_id, limit, cursor)
+    if http_cache.not_modified(etag, last_modified, if_none_match, if_modified_since):
+        return http_cache.validator_headers(etag, last_modified), None, None
+
+    # Pages are loaded backward from the newest message, each returned oldest-first.
+    # X-Next-Cursor continues with the older messages.
+    query = (
+        select(*serialization.columns(ChatMessage, schemas.MessageResponse))
+        .where(ChatMessage.session_id == session_id)
+    )
+    messages, next_cursor = pagination.paginate(db, query, ChatMessage, limit, cursor, descending=True)
+    return http_cache.validator_headers(etag, last_modified), messages, next_cursor
+
+
 # --- 10. Get Message History ---
 @app.get("/chat/{session_id}/history", response_model=list[schemas.MessageResponse])
-def get_chat_history(session_id: int, user_id: int, db: Session = Depends(get_db)):
-    session = db.query(ChatSession).filter(ChatSession.id == session_id, ChatSession.user_id == user_id).first()
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
+async def get_chat_history(
+        session_id: int,
+        user_id: int,
+        limit: int = pagination.PageLimit,
+        cursor: str = None,
+        if_none_match: str = Header(None),
+        if_modified_since: str = Header(None),
+        db: EndpointSession = Depends(get_db)
+):
+    headers, messages, next_cursor = await db.run_sync(
+        load_history_page, session_id, user_id, limit, cursor, if_none_match, if_modified_since
+    )
+    if messages is None:
+        return http_cache.not_modified_response(headers)
+
+    response = serialization.json_rows(reversed(messages), headers)
+    pagination.set_next_cursor(response, next_cursor)
+    return response
+
+# --- 10a. Bulk Export (gzip NDJSON, for analytics) ---
+@app.get("/export/{table}")
+def export_table(
+        table: str,
+        user_id: int = None,
+        since: datetime = None,
+        until: datetime = None,
+        cursor: str = None,
+        x_export_token: str = Header(None)
+):
+    """
+    Streams chat_sessions or chat_messages as gzip-compressed NDJSON (see api/export.py).
+    Resume a cut-off export by passing the last {"checkpoint": ...} value as ?cursor=.
+    """
+    if not EXPORT_TOKEN or x_export_token != EXPORT_TOKEN:
+        raise HTTPException(status_code=403, detail="Export not allowed")
+    if table not in export.TABLES:
+        raise HTTPException(status_code=404, detail="Unknown table")
+    after = export.decode_checkpoint(cursor) if cursor else None
+
+    def body():
+        # Own session: the export outlives the request's dependencies
+        with SessionLocal() as db:
+            for data, _ in export.NdjsonGzipExport(db, table, user_id, since, until, after):
+                yield data
+
+    return StreamingResponse(
+        body(),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{table}.ndjson.gz"'}
+    )
+
+
+# --- 10b. Search Messages ---
+@app.get("/chat/search", response_model=list[schemas.SearchResult])
+async def search_chat_messages(
+        user_id: int,
+        q: str,
+        response: Response,
+        limit: int = Query(20, ge=1, le=100),
+        cursor: str = None,
+        db: EndpointSession = Depends(get_db)
+):
+    """
+    The user's messages containing every word of `q`, most relevant first, with the matches
+    highlighted in `snippet` (see api/search.py). X-Next-Cursor continues with the next page.
+    """
+    results, next_cursor = await db.run_sync(search.search_messages, user_id, q, limit, cursor)
+    pagination.set_next_cursor(response, next_cursor)
+    return results
 
-    messages = db.query(ChatMessage).filter(ChatMessage.session_id == session_id).order_by(ChatMessage.created_at.asc()).all()
-    return messages
 
 # --- 11. Delete Session along with messages ---
 @app.delete("/chat/sessions/{session_id}", status_code=status.HTTP_200_OK)
-def delete_chat_session(
+async def delete_chat_session(
         session_id: int,
         user_id: int,
-        db: Session = Depends(get_db)
+        db: EndpointSession = Depends(get_db)
 ):
     # 1. Query the session, ensuring it belongs to the requesting user_id
-    session = db.query(ChatSession).filter(
-        ChatSession.id == session_id,
-        ChatSession.user_id == user_id
-    ).first()
+    session = await db.scalar(
+        select(ChatSession.id).where(
+            ChatSession.id == session_id,
+            ChatSession.user_id == user_id
+        )
+    )
 
     # 2. If not found (or belongs to another user), raise 404
-    if not session:
+    if session is None:
         raise HTTPException(
             status_code=404,
             detail="Session not found or you do not have permission to delete it"
         )
 
-    # 3. Delete and Commit
+    # 3. Delete and Commit (messages and archive follow by ON DELETE CASCADE)
+    cache_keys = await db.run_sync(tts_cache_keys_of, select(ChatMessage.content).where(ChatMessage.session_id == session_id))
     try:
-        db.delete(session)
-        db.commit()
+        await db.execute(
+            delete(ChatSession).where(ChatSession.id == session_id).execution_options(synchronize_session=False)
+        )
+        await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
+    # 4. Drop cached TTS audio and ownership for the deleted session
+    tts_cache.audio_cache.invalidate(cache_keys)
+    profiles.invalidate_session(session_id)
+
     return {"message": "Chat session and history deleted successfully"}
 
 
-# ---Helper: Cleaning for text ---
-def clean_text_for_tts(text: str) -> str:
-    if not text: return ""
+async def get_message_content(db: EndpointSession, message_id: int, user_id: int) -> str:
+    message = (await db.execute(
+        select(ChatMessage.session_id, ChatMessage.content).where(ChatMessage.id == message_id)
+    )).first()
+
+    if not message or not await db.run_sync(profiles.owns_session, message.session_id, user_id):
+        raise HTTPException(status_code=404, detail="Message not found")
 
-    # 1. Replace newlines with periods so the TTS pauses instead of choking
-    text = text.replace('\n', '. ')
+    # Release the pooled connection before awaiting Gemini
+    await db.commit()
+    return message.content
 
-    # 2. Remove markdown symbols (*, #, _, ~, `)
-    text = re.sub(r'[\*#_`~]', '', text)
+def tts_cache_keys(contents) -> list[str]:
+    return [tts_cache.cache_key(tts.clean_text_for_tts(content), tts.TTS_VOICE) for content in contents]
 
-    # 3. Remove links [text](url) -> text
-    text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text)
 
-    # 4. Collapse multiple spaces/dots
-    text = re.sub(r'\.+', '.', text)
-    text = re.sub(r'\s+', ' ', text)
+def tts_cache_keys_of(db: Session, contents_query) -> list[str]:
+    # Streamed in batches: only the cache keys are kept, not every message body
+    keys = []
+    for partition in db.scalars(contents_query.execution_options(yield_per=1000)).partitions():
+        keys.extend(tts_cache_keys(partition))
+    return keys
 
-    return text.strip()
 
 # --- 12. TTS Endpoint ---
 @app.get("/chat/message/{message_id}/tts")
-def generate_speech(
+async def generate_speech(
         message_id: int,
         user_id: int,
-        db: Session = Depends(get_db)
+        if_none_match: str = Header(None),
+        range_header: str = Header(None, alias="Range"),
+        if_range: str = Header(None),
+        db: EndpointSession = Depends(get_db)
 ):
     # Fetch Message
-    message = db.query(ChatMessage).join(ChatSession).filter(
-        ChatMessage.id == message_id,
-        ChatSession.user_id == user_id
-    ).first()
-
-    if not message:
-        raise HTTPException(status_code=404, detail="Message not found")
+    content = await get_message_content(db, message_id, user_id)
 
     # Clean Text
-    clean_text = clean_text_for_tts(message.content)
+    clean_text = tts.clean_text_for_tts(content)
     # print(f"DEBUG: TTS Input Text: {clean_text}") # Check your terminal
 
     if not clean_text or len(clean_text) < 2:
         raise HTTPException(status_code=400, detail="Text is empty")
 
+    # Audio is content-addressed, so the cache key doubles as a strong ETag
+    key = tts_cache.cache_key(clean_text, tts.TTS_VOICE)
+    headers = {"ETag": f'"{key}"', "Cache-Control": "private, max-age=86400"}
+
+    if http_cache.etag_matches(if_none_match, headers["ETag"]):
+        return http_cache.not_modified_response(headers)
+
+    # Range requests let the player seek within a long answer without refetching it all
+    final_wav_data = await run_in_threadpool(tts_cache.audio_cache.get, key)
+    if final_wav_data is not None:
+        return http_cache.ranged_response(final_wav_data, "audio/wav", headers, range_header, if_range)
+
+    # Only synthesis spends the "tts" limit: revalidations, cached replays and seeks are free
+    await run_in_threadpool(limits.enforce, "tts", user_id)
+    llm.check_capacity()
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-preview-tts",
-            contents=clean_text,
-            config=types.GenerateContentConfig(
-                response_modalities=["AUDIO"],
-                speech_config=types.SpeechConfig(
-                    voice_config=types.VoiceConfig(
-                        prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                            voice_name="Kore"
-                        )
-                    )
-                ),
-                safety_settings=[
-                    types.SafetySetting(
-                        category=HarmCategory.HARM_CATEGORY_HATE_SPEECH,
-                        threshold=HarmBlockThreshold.BLOCK_NONE
-                    ),
-                    types.SafetySetting(
-                        category=HarmCategory.HARM_CATEGORY_HARASSMENT,
-                        threshold=HarmBlockThreshold.BLOCK_NONE
-                    ),
-                    types.SafetySetting(
-                        category=HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
-                        threshold=HarmBlockThreshold.BLOCK_NONE
-                    ),
-                    types.SafetySetting(
-                        category=HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
-                        threshold=HarmBlockThreshold.BLOCK_NONE
-                    ),
-                ]
-            )
-        )
+        final_wav_data = await tts.synthesize_speech(clean_text)
+        await run_in_threadpool(tts_cache.audio_cache.put, key, final_wav_data)
+    except llm.Overloaded:
+        raise
+    except Exception as e:
+        print(f"TTS Exception: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-        if not response.candidates:
-            raise HTTPException(status_code=500, detail="No candidates returned")
+    return http_cache.ranged_response(final_wav_data, "audio/wav", headers, range_header, if_range)
 
-        if not response.candidates[0].content:
-            finish_reason = response.candidates[0].finish_reason
-            print(f"DEBUG: Still Blocked! Reason: {finish_reason}")
-            raise HTTPException(status_code=400, detail=f"TTS Blocked. Reason: {finish_reason}")
 
-        audio_content = response.candidates[0].content.parts[0].inline_data.data
+# --- 12a. Streaming TTS Endpoint (sentence-chunked) ---
+@app.get("/chat/message/{message_id}/tts/stream")
+async def stream_speech(
+        message_id: int,
+        user_id: int,
+        audio_format: str = Query("wav", alias="format"),
+        db: EndpointSession = Depends(get_db)
+):
+    """
+    Streams audio as each sentence chunk is synthesized: a WAV with an open-ended header
+    (format=wav) or raw 16-bit 24kHz mono PCM (format=pcm).
+    """
+    if audio_format not in ("wav", "pcm"):
+        raise HTTPException(status_code=400, detail="format must be 'wav' or 'pcm'")
+
+    content = await get_message_content(db, message_id, user_id)
+    clean_text = tts.clean_text_for_tts(content)
 
-        if isinstance(audio_content, str):
-            audio_bytes = base64.b64decode(audio_content)
-        else:
-            audio_bytes = audio_content
+    if not clean_text or len(clean_text) < 2:
+        raise HTTPException(status_code=400, detail="Text is empty")
 
-        # Convert to WAV
-        wav_buffer = io.BytesIO()
-        with wave.open(wav_buffer, 'wb') as wav_file:
-            wav_file.setnchannels(1)
-            wav_file.setsampwidth(2)
-            wav_file.setframerate(24000)
-            wav_file.writeframes(audio_bytes)
+    media_type = "audio/wav" if audio_format == "wav" else f"audio/L16;rate={tts.SAMPLE_RATE};channels={tts.CHANNELS}"
 
-        final_wav_data = wav_buffer.getvalue()
+    # Already synthesized in full: no need to stream
+    key = tts_cache.cache_key(clean_text, tts.TTS_VOICE)
+    cached = await run_in_threadpool(tts_cache.audio_cache.get, key)
+    if cached is not None:
+        return Response(content=cached if audio_format == "wav" else cached[44:], media_type=media_type)
 
-        return Response(content=final_wav_data, media_type="audio/wav")
+    await run_in_threadpool(limits.enforce, "tts", user_id)
+    llm.check_capacity()
+    audio = tts.stream_pcm(tts.split_into_chunks(clean_text))
 
+    # Wait for the first chunk so a failed synthesis still gets a proper error status
+    try:
+        first_chunk = await audio.__anext__()
+    except llm.Overloaded:
+        await audio.aclose()
+        raise
     except Exception as e:
+        await audio.aclose()
         print(f"TTS Exception: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def body():
+        try:
+            if audio_format == "wav":
+                yield tts.wav_stream_header()
+            yield first_chunk
+            async for pcm in audio:
+                yield pcm
+        except Exception as e:
+            # Headers are already sent; the client sees a truncated stream
+            print(f"TTS Exception: {e}")
+        finally:
+            await audio.aclose()
+
+    return StreamingResponse(body(), media_type=media_type, headers={"X-Accel-Buffering": "no"})
+
+
+# --- 13. Metrics (Prometheus text format) ---
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+# --- 14. Database Health (connection pool usage) ---
+@app.get("/health/db")
+async def health_db():
+    # `pool` serves the endpoints; `sync_pool` the background workers and exports (the same
+    # pool on SQLite, see db/database.py)
+    pools = {"pool": pool_status(endpoint_engine), "sync_pool": pool_status(engine)}
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.execute(text("SELECT 1"))
+    except Exception as e:
+        print(f"DB health check failed: {e}")
+        raise HTTPException(status_code=503, detail={"status": "unavailable", **pools})
+    return {"status": "ok", **pools}
+
+
+# --- 15. Readiness (for the load balancer) ---
+@app.get("/ready")
+async def ready():
+    # 503 until the database answers and the Gemini client is built (api/llm.py warms it up
+    # after startup), so traffic is only routed to a worker once it can serve every endpoint
+    checks = {"database": True, "gemini_client": llm.is_ready()}
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.execute(text("SELECT 1"))
+    except Exception as e:
+        print(f"Readiness check failed: {e}")
+        checks["database"] = False
+    if not all(checks.values()):
+        return JSONResponse(status_code=503, content={"status": "starting", "checks": checks})
+    return {"status": "ready", "checks": checks}
@@ -0,0 +1,142 @@
+"""
+Pluggable OTP storage (OTP_STORE).
+
+- memory (default): phone -> (code, expiry) map with lazy expiry on read and a periodic sweeper.
+  No DB writes on /auth/send-otp. Codes live in one worker process, so run a single worker
+  or use the db store.
+- db: the otp_codes table, one row per phone (unique index), written with a single upsert.
+  Expired rows are deleted in batches by the same sweeper.
+
+Methods do blocking work; call them from the threadpool.
+"""
+import asyncio
+import os
+import threading
+import time
+from datetime import timedelta
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from api import metrics
+from db.database import SessionLocal
+from db.models import OTP, get_ist_time
+
+OTP_STORE = os.getenv("OTP_STORE", "memory")
+OTP_TTL_SECONDS = int(os.getenv("OTP_TTL_SECONDS", "300"))
+OTP_SWEEP_INTERVAL = int(os.getenv("OTP_SWEEP_INTERVAL", "60"))
+OTP_CLEANUP_BATCH = int(os.getenv("OTP_CLEANUP_BATCH", "1000"))
+
+_sweeper: asyncio.Task = None
+
+otp_swept = metrics.Counter("otp_codes_swept_total", "Expired OTP codes removed by the sweeper")
+
+
+class MemoryOTPStore:
+    def __init__(self):
+        self._codes = {}   # phone -> (code, expires_at on the monotonic clock)
+        self._lock = threading.Lock()
+
+    def put(self, phone: str, code: str, ttl: int = OTP_TTL_SECONDS):
+        with self._lock:
+            self._codes[phone] = (code, time.monotonic() + ttl)
+
+    def get(self, phone: str):
+        with self._lock:
+            entry = self._codes.get(phone)
+            if entry is None:
+                return None
+            code, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._codes[phone]
+                return None
+            return code
+
+    def sweep(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            expired = [phone for phone, (_, expires_at) in self._codes.items() if expires_at <= now]
+            for phone in expired:
+                del self._codes[phone]
+        return len(expired)
+
+    def __len__(self):
+        return len(self._codes)
+
+
+class DBOTPStore:
+    def put(self, phone: str, code: str, ttl: int = OTP_TTL_SECONDS):
+        values = {
+            "phone_number": phone,
+            "otp_code": code,
+            "expires_at": get_ist_time() + timedelta(seconds=ttl),
+            "is_used": False,
+        }
+        with SessionLocal() as db:
+            # One statement instead of DELETE + commit + INSERT + commit
+            dialect = db.get_bind().dialect.name
+            insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+            stmt = insert(OTP).values(**values)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[OTP.phone_number],
+                set_={key: stmt.excluded[key] for key in ("otp_code", "expires_at", "is_used")}
+            )
+            db.execute(stmt)
+            db.commit()
+
+    def get(self, phone: str):
+        with SessionLocal() as db:
+            return db.execute(
+                select(OTP.otp_code).where(OTP.phone_number == phone, OTP.expires_at > get_ist_time())
+            ).scalar()
+
+    def sweep(self) -> int:
+        # Small batches keep each write transaction (and the SQLite write lock) short
+        removed = 0
+        while True:
+            with SessionLocal() as db:
+                batch = select(OTP.id).where(OTP.expires_at <= get_ist_time()).limit(OTP_CLEANUP_BATCH)
+                deleted = db.execute(delete(OTP).where(OTP.id.in_(batch))).rowcount
+                db.commit()
+            removed += deleted
+            if deleted < OTP_CLEANUP_BATCH:
+                return removed
+
+
+def _create_store():
+    if OTP_STORE == "memory":
+        return MemoryOTPStore()
+    if OTP_STORE == "db":
+        return DBOTPStore()
+    raise ValueError(f"Unknown OTP_STORE: {OTP_STORE}")
+
+
+store = _create_store()
+
+if isinstance(store, MemoryOTPStore):
+    metrics.Gauge("otp_codes_active", "OTP codes held in memory (including not yet swept expired ones)",
+                  fn=lambda: len(store))
+
+
+# --- Periodic sweeper ---
+async def _sweep_forever():
+    while True:
+        await asyncio.sleep(OTP_SWEEP_INTERVAL)
+        try:
+            otp_swept.inc(await run_in_threadpool(store.sweep))
+        except Exception as sweep_error:
+            print(f"OTP sweep failed ({sweep_error}).")
+
+
+async def start():
+    global _sweeper
+    _sweeper = asyncio.create_task(_sweep_forever())
+
+
+async def stop():
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        await asyncio.gather(_sweeper, return_exceptions=True)
+        _sweeper = None
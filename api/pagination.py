@@ -0,0 +1,73 @@
+"""
+Keyset (cursor) pagination on (created_at, id), or on another timestamp column and id.
+
+Cursors are opaque to clients: urlsafe base64 of the last row's timestamp and id. The next
+page's cursor is returned in the X-Next-Cursor response header; no header means no more rows.
+"""
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+PageLimit = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(db: Session, query, model, limit: int, cursor: str = None, descending: bool = False,
+             key=None):
+    """
+    Returns (rows, next_cursor) for a select() of `model` columns, ordered by (key, id) with key
+    defaulting to model.created_at. The columns must include the key and id; rows are returned as
+    tuples, not ORM objects. With descending=True the page holds the rows just before the cursor,
+    newest first. Synchronous: the endpoints call it through db.run_sync.
+    """
+    key = model.created_at if key is None else key
+    if cursor:
+        cursor_at, cursor_id = decode_cursor(cursor)
+        if descending:
+            query = query.where(or_(
+                key < cursor_at,
+                and_(key == cursor_at, model.id < cursor_id)
+            ))
+        else:
+            query = query.where(or_(
+                key > cursor_at,
+                and_(key == cursor_at, model.id > cursor_id)
+            ))
+
+    if descending:
+        query = query.order_by(key.desc(), model.id.desc())
+    else:
+        query = query.order_by(key.asc(), model.id.asc())
+
+    rows = db.execute(query.limit(limit + 1)).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    last = rows[limit - 1]
+    return rows[:limit], encode_cursor(getattr(last, key.key), last.id)
+
+
+def set_next_cursor(response: Response, next_cursor: str):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
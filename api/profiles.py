@@ -0,0 +1,122 @@
+"""
+In-process caches for the lookups every chat, history and TTS request repeats:
+- user profiles, with the system instructions prebuilt from them
+- session -> owner user_id
+
+Profiles change only through PUT /users/update/{user_id} and sessions only move on delete, so
+entries are dropped explicitly from those endpoints. The TTL bounds staleness when several
+workers run, since each one holds its own copy.
+"""
+import os
+from typing import NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from api import metrics
+from api.cache import TTLCache
+from db.models import User, ChatSession
+
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "300"))
+
+_profiles = TTLCache(PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL)
+_owners = TTLCache(PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL)
+
+cache_requests = metrics.Counter("profile_cache_requests_total", "Profile and session owner cache lookups by cache and result")
+
+
+class Profile(NamedTuple):
+    id: int
+    full_name: Optional[str]
+    has_farm: Optional[str]
+    water_supply: Optional[str]
+    farm_type: Optional[str]
+    system_instruction: str
+    # Without the farmer's name: for first answers shared across farmers (api/answer_cache.py)
+    shared_instruction: str
+
+
+def build_system_instruction(user: User, with_name: bool = True):
+    """
+    Creates a tailored persona for the AI based on the specific farmer's profile.
+    """
+    name = f"""
+    - Name: {user.full_name}""" if with_name else ""
+    profile_context = f"""
+    FARMER PROFILE:{name}
+    - Has Farm: {user.has_farm}
+    - Water Supply: {user.water_supply}
+    - Farm Type: {user.farm_type}
+    """
+
+    return f"""
+    You are an expert Indian Agricultural AI Advisor (Kisan Mitra). 
+    
+    YOUR GOAL: Provide specific, actionable, and region-aware farming advice.
+    
+    CONTEXT:
+    {profile_context if user.has_farm == 'yes' else "User is interested in farming but details are incomplete."}
+    
+    GUIDELINES:
+    1. STRICTLY AVOID GENERIC DATES. If asked about sowing/harvesting, DO NOT say "June to July". 
+       Instead, ask for the user's District/State if you don't know it, then give specific windows like "First 2 weeks of June for [Region Name]".
+    2. USE FARMER'S CONTEXT: If they have 'well' water, suggest irrigation methods suitable for wells.
+    3. LANGUAGE: Answer in the same language the user asks (mostly Hinglish or English).
+    4. TONE: Professional, respectful, yet simple (like an experienced agronomist).
+    5. FORMATTING: Use bullet points for steps.
+    """
+
+
+def get_profile(db: Session, user_id: int) -> Optional[Profile]:
+    profile = _profiles.get(user_id)
+    if profile is not None:
+        cache_requests.inc(cache="profile", result="hit")
+        return profile
+
+    cache_requests.inc(cache="profile", result="miss")
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        return None
+    profile = Profile(
+        id=user.id,
+        full_name=user.full_name,
+        has_farm=user.has_farm,
+        water_supply=user.water_supply,
+        farm_type=user.farm_type,
+        system_instruction=build_system_instruction(user),
+        shared_instruction=build_system_instruction(user, with_name=False)
+    )
+    _profiles.set(user_id, profile)
+    return profile
+
+
+def remember_owner(session_id: int, user_id: int):
+    _owners.set(session_id, user_id)
+
+
+def session_owner(db: Session, session_id: int) -> Optional[int]:
+    owner = _owners.get(session_id)
+    if owner is not None:
+        cache_requests.inc(cache="session_owner", result="hit")
+        return owner
+
+    cache_requests.inc(cache="session_owner", result="miss")
+    row = db.query(ChatSession.user_id).filter(ChatSession.id == session_id).first()
+    if not row:
+        return None
+    _owners.set(session_id, row.user_id)
+    return row.user_id
+
+
+def owns_session(db: Session, session_id: int, user_id: int) -> bool:
+    return session_owner(db, session_id) == user_id
+
+
+def invalidate_user(user_id: int, session_ids=()):
+    _profiles.pop(user_id)
+    for session_id in session_ids:
+        _owners.pop(session_id)
+
+
+def invalidate_session(session_id: int):
+    _owners.pop(session_id)
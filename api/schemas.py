@@ -69,4 +69,29 @@ class SessionResponse(BaseModel):
     created_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+class SessionOverviewResponse(BaseModel):
+    id: int
+    user_id: int
+    title: str
+    created_at: datetime
+    last_activity_at: datetime
+    message_count: int
+    last_message_preview: Optional[str] = None
+    last_message_role: Optional[str] = None
+    last_message_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class SearchResult(BaseModel):
+    message_id: int
+    session_id: int
+    session_title: Optional[str] = None
+    role: str
+    snippet: str
+    score: float
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,178 @@
+"""
+Full-text search over a user's chat messages (GET /chat/search).
+
+The index is maintained by the database as messages are inserted and deleted (see db/models.py):
+- SQLite: FTS5 table chat_messages_fts, ranked with bm25() and highlighted with snippet()
+- Postgres: GIN index on to_tsvector('simple', content), ranked with ts_rank() and
+  highlighted with ts_headline()
+
+Every word of the query must appear in the message (no stemming: "dose" does not match "doses").
+Matches are wrapped in <mark>...</mark>.
+
+Archived sessions (api/archive.py) have no rows in chat_messages, so the index has nothing for
+them. Once the live matches run out, the user's archive blobs are unpacked into an in-memory
+SQLite database with the same FTS5 table and searched with the same query, so old seasons stay
+findable. Their matches follow the live ones, ranked among themselves. That costs a read of every
+archived session of the user, but only on the pages past the last live match.
+
+Results are ordered by relevance, so pages are cut by offset rather than by (created_at, id);
+the cursor in X-Next-Cursor is opaque all the same.
+"""
+import base64
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from api import archive
+from db.models import SEARCH_FTS_TABLE, SQLITE_SEARCH_DDL, CreatedAt, ChatSession, ChatSessionArchive
+
+MAX_QUERY_TERMS = 16
+SNIPPET_TOKENS = 16
+MARK_START, MARK_END = "<mark>", "</mark>"
+# Each archive row holds a whole session's messages
+SEARCH_BATCH_ARCHIVES = int(os.getenv("SEARCH_BATCH_ARCHIVES", "50"))
+
+# Rank first, then build snippets for the page only: snippet() over every match costs as much as ranking
+_SQLITE_SEARCH_SQL = f"""
+    WITH page AS (
+        SELECT rowid AS id, -bm25({SEARCH_FTS_TABLE}, 1.0, 0.0) AS score
+        FROM {SEARCH_FTS_TABLE}
+        WHERE {SEARCH_FTS_TABLE} MATCH :match
+        ORDER BY score DESC, rowid DESC
+        LIMIT :limit OFFSET :offset
+    )
+    SELECT m.id AS message_id, m.session_id, s.title AS session_title, m.role, m.created_at,
+           snippet({SEARCH_FTS_TABLE}, 0, '{MARK_START}', '{MARK_END}', '…', {SNIPPET_TOKENS}) AS snippet,
+           page.score
+    FROM page
+    JOIN {SEARCH_FTS_TABLE} ON {SEARCH_FTS_TABLE}.rowid = page.id
+    JOIN chat_messages m ON m.id = page.id
+    JOIN chat_sessions s ON s.id = m.session_id
+    WHERE {SEARCH_FTS_TABLE} MATCH :match
+    ORDER BY page.score DESC, page.id DESC
+"""
+_SQLITE_SEARCH = text(_SQLITE_SEARCH_SQL).columns(created_at=CreatedAt)
+
+_POSTGRES_SEARCH = text(f"""
+    SELECT m.id AS message_id, m.session_id, s.title AS session_title, m.role, m.created_at,
+           ts_headline('simple', m.content, q,
+                       'StartSel={MARK_START}, StopSel={MARK_END}, MaxWords={SNIPPET_TOKENS}, MinWords=5') AS snippet,
+           ts_rank(to_tsvector('simple', m.content), q) AS score
+    FROM chat_messages m
+    JOIN chat_sessions s ON s.id = m.session_id,
+         plainto_tsquery('simple', :terms) AS q
+    WHERE s.user_id = :user_id AND to_tsvector('simple', m.content) @@ q
+    ORDER BY score DESC, m.id DESC
+    LIMIT :limit OFFSET :offset
+""").columns(created_at=CreatedAt)
+
+
+def query_terms(q: str) -> list[str]:
+    """
+    Splits the search box input into words, dropping pure punctuation.
+    """
+    terms = [term for term in q.split() if any(ch.isalnum() for ch in term)]
+    return terms[:MAX_QUERY_TERMS]
+
+
+def fts5_match(user_id: int, terms: list[str]) -> str:
+    # Each term is a quoted FTS5 string, so query syntax (AND, NEAR, *, :) typed by users is inert
+    phrases = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+    return f"owner:u{user_id} AND content:({phrases})"
+
+
+# The in-memory database for archived sessions: tables named like the live ones, so
+# _SQLITE_SEARCH_SQL runs on it unchanged
+_ARCHIVE_SCHEMA = (
+    SQLITE_SEARCH_DDL[0],
+    "CREATE TABLE chat_sessions (id INTEGER PRIMARY KEY, title TEXT)",
+    "CREATE TABLE chat_messages (id INTEGER PRIMARY KEY, session_id INTEGER, role TEXT, created_at TEXT)",
+)
+
+
+def encode_offset(offset: int, archived: bool = False) -> str:
+    position = {"offset": offset, "archived": True} if archived else {"offset": offset}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def decode_offset(cursor: str) -> tuple[bool, int]:
+    """
+    (archived, offset): whether the cursor points into the archived matches, and how far.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+        archived, offset = bool(position.get("archived")), int(position["offset"])
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return archived, offset
+
+
+def search_archived(db: Session, user_id: int, terms: list[str], limit: int, offset: int) -> list[dict]:
+    """
+    Matches in the user's archived sessions, best first, in the same shape as the live rows.
+    """
+    archives = db.execute(
+        select(ChatSessionArchive.session_id, ChatSession.title, ChatSessionArchive.blob)
+        .join(ChatSession, ChatSession.id == ChatSessionArchive.session_id)
+        .where(ChatSession.user_id == user_id)
+        .execution_options(yield_per=SEARCH_BATCH_ARCHIVES)
+    )
+    owner = f"u{user_id}"
+    conn = sqlite3.connect(":memory:")
+    try:
+        for statement in _ARCHIVE_SCHEMA:
+            conn.execute(statement)
+        for row in archives:
+            messages = archive.unpack(row.blob)
+            conn.execute("INSERT INTO chat_sessions VALUES (?, ?)", (row.session_id, row.title))
+            conn.executemany("INSERT INTO chat_messages VALUES (?, ?, ?, ?)", [
+                (msg["id"], row.session_id, msg["role"], msg["created_at"].isoformat()) for msg in messages
+            ])
+            conn.executemany(f"INSERT INTO {SEARCH_FTS_TABLE} (rowid, content, owner) VALUES (?, ?, ?)", [
+                (msg["id"], msg["content"], owner) for msg in messages
+            ])
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(_SQLITE_SEARCH_SQL, {
+            "match": fts5_match(user_id, terms), "limit": limit, "offset": offset
+        }).fetchall()
+    finally:
+        conn.close()
+    return [dict(row, created_at=datetime.fromisoformat(row["created_at"])) for row in rows]
+
+
+def search_messages(db: Session, user_id: int, q: str, limit: int, cursor: str = None):
+    """
+    Returns (rows, next_cursor): the user's messages matching every word of `q`, best first,
+    then the matches in archived sessions.
+    """
+    terms = query_terms(q)
+    if not terms:
+        return [], None
+    archived, offset = decode_offset(cursor) if cursor else (False, 0)
+
+    rows = []
+    if not archived:
+        if db.get_bind().dialect.name == "postgresql":
+            stmt, params = _POSTGRES_SEARCH, {"user_id": user_id, "terms": " ".join(terms)}
+        else:
+            stmt, params = _SQLITE_SEARCH, {"match": fts5_match(user_id, terms)}
+
+        rows = db.execute(stmt, {**params, "limit": limit + 1, "offset": offset}).all()
+        if len(rows) > limit:
+            return rows[:limit], encode_offset(offset + limit)
+        offset = 0
+
+    # The live matches ran out on this page: fill it from the archived sessions
+    wanted = limit - len(rows)
+    older = search_archived(db, user_id, terms, wanted + 1, offset)
+    if len(older) <= wanted:
+        return rows + older, None
+    return rows + older[:wanted], encode_offset(offset + wanted, archived=True)
@@ -0,0 +1,113 @@
+"""
+Per-request timing: route latency histograms, SQL query metrics and a Server-Timing header.
+
+TimingMiddleware opens a per-request bucket in a ContextVar. DB queries (engine events) and
+Gemini calls (api/llm.py) add their durations to it, and the totals go out as
+`Server-Timing: db;dur=..., llm;dur=..., total;dur=...` so one slow request can be broken
+down from the client. run_in_threadpool copies the context, so sync DB work is counted too.
+For streaming responses the header only covers the work done before the first byte.
+"""
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from api import metrics
+
+request_latency = metrics.Histogram(
+    "http_request_duration_seconds", "Request latency by route template, method and status"
+)
+db_queries = metrics.Counter("db_queries_total", "SQL statements executed, by operation")
+db_query_latency = metrics.Histogram(
+    "db_query_duration_seconds", "SQL statement latency by operation",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+_request_phases: ContextVar = ContextVar("request_phases", default=None)
+
+_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+
+def record(phase: str, seconds: float):
+    """
+    Adds `seconds` to `phase` for the request being handled (no-op outside a request).
+    """
+    phases = _request_phases.get()
+    if phases is not None:
+        total, count = phases.get(phase, (0.0, 0))
+        phases[phase] = (total + seconds, count + 1)
+
+
+def server_timing(phases: dict, total: float) -> str:
+    entries = [
+        f'{phase};dur={seconds * 1000:.1f};desc="count={count}"'
+        for phase, (seconds, count) in phases.items()
+    ]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def _operation(statement: str) -> str:
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return verb if verb in _OPERATIONS else "OTHER"
+
+
+def instrument_engine(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        operation = _operation(statement)
+        db_queries.inc(operation=operation)
+        db_query_latency.observe(elapsed, operation=operation)
+        record("db", elapsed)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        # after_cursor_execute does not fire for failed statements
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_start"):
+            connection.info["query_start"].pop()
+
+
+class TimingMiddleware:
+    """
+    Pure ASGI middleware, so streamed responses are passed through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        phases = {}
+        token = _request_phases.set(phases)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                header = server_timing(phases, time.perf_counter() - start)
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_phases.reset(token)
+            route = scope.get("route")
+            request_latency.observe(
+                time.perf_counter() - start,
+                route=getattr(route, "path", "unmatched"),
+                method=scope["method"],
+                status=status_code
+            )
@@ -0,0 +1,113 @@
+"""
+Background session auto-titling.
+
+The chat endpoints only enqueue (session_id, user_id, first query); a small pool of workers calls
+gemini-2.5-flash-lite and writes ChatSession.title, so titling never delays a chat reply.
+Titles count against the user's "title" rate limit (api/limits.py); over the limit the default title stays.
+"""
+import os
+import re
+
+from fastapi.concurrency import run_in_threadpool
+
+from api import limits, llm, metrics
+from api.background import BackgroundQueue
+from db.database import SessionLocal
+from db.models import ChatSession
+
+TITLE_QUEUE_SIZE = int(os.getenv("TITLE_QUEUE_SIZE", "1000"))
+TITLE_WORKERS = int(os.getenv("TITLE_WORKERS", "4"))
+
+DEFAULT_TITLES = ["New Consultation", "New Chat", "string"]
+
+titles_completed = metrics.Counter("title_generation_completed_total", "Session titles generated and saved")
+titles_failed = metrics.Counter("title_generation_failed_total", "Session title generations that failed")
+titles_dropped = metrics.Counter("title_generation_dropped_total", "Title jobs dropped because the queue was full or the user was rate limited")
+queue_depth = metrics.Gauge("title_queue_depth", "Title jobs waiting for a worker",
+                            fn=lambda: _jobs.qsize())
+
+
+def needs_title(current_title: str) -> bool:
+    return not current_title or current_title.strip() == "" or current_title in DEFAULT_TITLES
+
+
+def enqueue(session_id: int, user_id: int, content: str) -> bool:
+    """
+    Schedule a title for the session. Never blocks; returns False if the job was dropped.
+    A session that already has a job queued or running is not queued again.
+    """
+    if not _jobs.running:
+        print("Title workers not running. Keeping default title.")
+        titles_dropped.inc()
+        return False
+    if not _jobs.put(session_id, session_id, user_id, content):
+        titles_dropped.inc()
+        return False
+    return True
+
+
+async def generate_title(content: str) -> str:
+    title_prompt = f"""
+    Summarize this into a 3-5 word title. 
+    RULES:
+    1. Do NOT use numbering (e.g., no "1.", no "-").
+    2. Do NOT use quotes.
+    3. Just output the raw words.
+    
+    Query: {content}
+    """
+
+    types = await llm.genai_types()
+    title_response = await llm.generate_content(
+        model="gemini-2.5-flash-lite",
+        contents=title_prompt,
+        config=types.GenerateContentConfig(max_output_tokens=20)
+    )
+
+    new_title = ""
+    if title_response.text:
+        new_title = title_response.text.strip()
+    elif title_response.candidates and title_response.candidates[0].content.parts:
+        new_title = title_response.candidates[0].content.parts[0].text.strip()
+
+    if new_title:
+        # REGEX CLEANUP: Removes "1.", "1)", "- ", "* " from the start
+        new_title = re.sub(r'^[\d\.\-\*\s]+', '', new_title)
+
+        # Remove quotes
+        new_title = new_title.replace('"', '').replace("'", "").strip()
+
+    return new_title
+
+
+def save_title(session_id: int, title: str) -> bool:
+    # Only replace a default title, in case the session was renamed while the job was queued
+    with SessionLocal() as db:
+        updated = db.query(ChatSession).filter(
+            ChatSession.id == session_id,
+            (ChatSession.title.is_(None)) | (ChatSession.title.in_(DEFAULT_TITLES + [""]))
+        ).update({"title": title}, synchronize_session=False)
+        db.commit()
+    return updated > 0
+
+
+async def _title_session(session_id: int, user_id: int, content: str):
+    if not await run_in_threadpool(limits.allow, "title", user_id):
+        titles_dropped.inc()
+        return
+    new_title = await generate_title(content)
+    if not new_title:
+        titles_failed.inc()
+    elif await run_in_threadpool(save_title, session_id, new_title):
+        titles_completed.inc()
+        print(f"Auto-updated session title to: {new_title}")
+
+
+def _title_failed(job, title_error: Exception):
+    titles_failed.inc()
+    print(f"Title generation failed ({title_error}). Keeping default title.")
+
+
+_jobs = BackgroundQueue("title", TITLE_QUEUE_SIZE, TITLE_WORKERS, _title_session, _title_failed)
+start = _jobs.start
+stop = _jobs.stop
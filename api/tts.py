@@ -0,0 +1,172 @@
+"""
+Gemini text-to-speech: text cleanup, one-shot WAV synthesis, and sentence-chunked streaming.
+"""
+import asyncio
+import base64
+import io
+import os
+import re
+import struct
+import wave
+
+from fastapi import HTTPException
+
+from api import llm
+
+TTS_MODEL = "gemini-2.5-flash-preview-tts"
+TTS_VOICE = "Kore"
+
+# Gemini TTS returns 16-bit mono PCM at 24kHz
+SAMPLE_RATE = 24000
+SAMPLE_WIDTH = 2
+CHANNELS = 1
+
+# Streaming: max characters per TTS request, and how many chunks are synthesized ahead of playback
+TTS_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", "250"))
+TTS_STREAM_LOOKAHEAD = int(os.getenv("TTS_STREAM_LOOKAHEAD", "2"))
+# Per-attempt deadline for a TTS call; whole answers take longer than chat replies
+TTS_TIMEOUT = float(os.getenv("TTS_TIMEOUT", "60"))
+
+
+# ---Helper: Cleaning for text ---
+def clean_text_for_tts(text: str) -> str:
+    if not text: return ""
+
+    # 1. Replace newlines with periods so the TTS pauses instead of choking
+    text = text.replace('\n', '. ')
+
+    # 2. Remove markdown symbols (*, #, _, ~, `)
+    text = re.sub(r'[\*#_`~]', '', text)
+
+    # 3. Remove links [text](url) -> text
+    text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text)
+
+    # 4. Collapse multiple spaces/dots
+    text = re.sub(r'\.+', '.', text)
+    text = re.sub(r'\s+', ' ', text)
+
+    return text.strip()
+
+
+def split_into_chunks(clean_text: str, max_chars: int = TTS_CHUNK_CHARS) -> list[str]:
+    """
+    Splits cleaned text on sentence ends (. ! ? and the Devanagari danda) and packs
+    whole sentences into chunks of at most max_chars. Longer sentences are cut on spaces.
+    """
+    sentences = [s for s in re.split(r'(?<=[\.\!\?।])\s+', clean_text) if s]
+
+    chunks = []
+    current = ""
+    for sentence in sentences:
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def synthesize_pcm(clean_text: str) -> bytes:
+    types = await llm.genai_types()
+    response = await llm.generate_content(
+        model=TTS_MODEL,
+        contents=clean_text,
+        timeout=TTS_TIMEOUT,
+        config=types.GenerateContentConfig(
+            response_modalities=["AUDIO"],
+            speech_config=types.SpeechConfig(
+                voice_config=types.VoiceConfig(
+                    prebuilt_voice_config=types.PrebuiltVoiceConfig(
+                        voice_name=TTS_VOICE
+                    )
+                )
+            ),
+            safety_settings=[
+                types.SafetySetting(
+                    category=types.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
+                    threshold=types.HarmBlockThreshold.BLOCK_NONE
+                ),
+                types.SafetySetting(
+                    category=types.HarmCategory.HARM_CATEGORY_HARASSMENT,
+                    threshold=types.HarmBlockThreshold.BLOCK_NONE
+                ),
+                types.SafetySetting(
+                    category=types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
+                    threshold=types.HarmBlockThreshold.BLOCK_NONE
+                ),
+                types.SafetySetting(
+                    category=types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
+                    threshold=types.HarmBlockThreshold.BLOCK_NONE
+                ),
+            ]
+        )
+    )
+
+    if not response.candidates:
+        raise HTTPException(status_code=500, detail="No candidates returned")
+
+    if not response.candidates[0].content:
+        finish_reason = response.candidates[0].finish_reason
+        print(f"DEBUG: Still Blocked! Reason: {finish_reason}")
+        raise HTTPException(status_code=400, detail=f"TTS Blocked. Reason: {finish_reason}")
+
+    audio_content = response.candidates[0].content.parts[0].inline_data.data
+
+    if isinstance(audio_content, str):
+        return base64.b64decode(audio_content)
+    return audio_content
+
+
+def pcm_to_wav(audio_bytes: bytes) -> bytes:
+    wav_buffer = io.BytesIO()
+    with wave.open(wav_buffer, 'wb') as wav_file:
+        wav_file.setnchannels(CHANNELS)
+        wav_file.setsampwidth(SAMPLE_WIDTH)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(audio_bytes)
+
+    return wav_buffer.getvalue()
+
+
+async def synthesize_speech(clean_text: str) -> bytes:
+    return pcm_to_wav(await synthesize_pcm(clean_text))
+
+
+def wav_stream_header() -> bytes:
+    # Total length is unknown while streaming; 0xFFFFFFFF sizes tell players to read until EOF
+    block_align = CHANNELS * SAMPLE_WIDTH
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 0xFFFFFFFF, b'WAVE',
+        b'fmt ', 16, 1, CHANNELS, SAMPLE_RATE, SAMPLE_RATE * block_align, block_align, SAMPLE_WIDTH * 8,
+        b'data', 0xFFFFFFFF
+    )
+
+
+async def stream_pcm(chunks: list[str], lookahead: int = TTS_STREAM_LOOKAHEAD):
+    """
+    Yields PCM for each chunk in order. Up to `lookahead` chunks are synthesized concurrently,
+    so at most that many chunks of audio are held in memory at once.
+    """
+    tasks = {}
+    try:
+        for i in range(len(chunks)):
+            for j in range(i, min(i + lookahead, len(chunks))):
+                if j not in tasks:
+                    tasks[j] = asyncio.create_task(synthesize_pcm(chunks[j]))
+            yield await tasks.pop(i)
+    finally:
+        for task in tasks.values():
+            task.cancel()
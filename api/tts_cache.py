@@ -0,0 +1,147 @@
+"""
+Content-addressed cache for synthesized TTS audio (final WAV bytes).
+
+Two tiers, both LRU:
+- memory: a small hot tier bounded by TTS_CACHE_MEMORY_BYTES
+- disk:   one file per entry in TTS_CACHE_DIR, bounded by TTS_CACHE_MAX_BYTES for the whole
+          directory, so several workers can share it
+
+Keys are sha256(voice name + cleaned text), so the same answer replayed by any farmer is a hit.
+Methods do blocking file IO; call them from the threadpool.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from api import metrics
+
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "./tts_cache")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+TTS_CACHE_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+
+cache_requests = metrics.Counter("tts_cache_requests_total", "TTS cache lookups by result (memory, disk, miss)")
+
+
+def cache_key(clean_text: str, voice_name: str) -> str:
+    return hashlib.sha256(f"{voice_name}\0{clean_text}".encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """
+    The files are the source of truth, so workers can share one directory: a lookup that is not
+    in this process's memory tier goes to the file, every hit bumps the file's mtime (the LRU
+    order all workers see), and each put re-reads the directory to hold it to max_bytes. That
+    scan costs a stat per cached file, next to a synthesis that takes seconds.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, memory_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()   # key -> bytes, least recently used first
+        self._memory_size = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.wav")
+
+    def get(self, key: str):
+        path = self._path(key)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+
+        if data is not None:
+            try:
+                os.utime(path)
+                cache_requests.inc(result="memory")
+                return data
+            except FileNotFoundError:
+                # Invalidated or evicted by another worker sharing the directory
+                with self._lock:
+                    self._forget(key)
+                cache_requests.inc(result="miss")
+                return None
+
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            cache_requests.inc(result="miss")
+            return None
+
+        with self._lock:
+            self._remember(key, data)
+        cache_requests.inc(result="disk")
+        return data
+
+    def put(self, key: str, data: bytes):
+        # Created on first use, not at import
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temp file first so readers never see a partial WAV
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+
+        with self._lock:
+            self._remember(key, data)
+        self._evict_disk()
+
+    def invalidate(self, keys):
+        keys = list(keys)
+        with self._lock:
+            for key in keys:
+                self._forget(key)
+        # Whichever worker wrote the file
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _remember(self, key: str, data: bytes):
+        if len(data) > self.memory_bytes:
+            return
+        self._forget(key)
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _forget(self, key: str):
+        data = self._memory.pop(key, None)
+        if data is not None:
+            self._memory_size -= len(data)
+
+    def _evict_disk(self):
+        # The whole directory counts, whichever worker wrote the files; oldest mtime goes first
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".wav"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+
+        disk_size = sum(size for _, _, size in entries)
+        for _, path, size in sorted(entries):
+            if disk_size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            disk_size -= size
+
+
+audio_cache = AudioCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES, TTS_CACHE_MEMORY_BYTES)
@@ -0,0 +1,122 @@
+"""
+Cold start of a worker: how long `import api.main` takes (python -X importtime, in fresh
+interpreters) and, for a real uvicorn worker, how long until it answers /health/db (accepting
+traffic) and /ready (Gemini client built, see api/llm.py).
+
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --runs 5 --max-import-ms 1500   # exit 1 above the budget (CI)
+
+Import time is also broken down by top-level package (self time), so a heavy import creeping
+back in (e.g. google.genai at import) shows up by name.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+
+def bench_env(tmp: str) -> dict:
+    return {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tmp}/bench.db",
+        "TTS_CACHE_DIR": f"{tmp}/tts_cache",
+        "GEMINI_API_KEY": os.environ.get("GEMINI_API_KEY", "bench"),
+        "DB_AUTO_CREATE": "true",
+    }
+
+
+def import_profile(env: dict) -> tuple[float, dict]:
+    """
+    (total ms, {top-level package: self ms}) of one `import api.main` in a fresh interpreter.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import api.main"],
+        env=env, capture_output=True, text=True, check=True
+    )
+    total = 0.0
+    packages = defaultdict(float)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        packages[name.split(".")[0]] += int(self_us) / 1000
+        if name == "api.main":
+            total = int(cumulative_us) / 1000
+    return total, packages
+
+
+def worker_startup(env: dict, port: int) -> dict:
+    """
+    Seconds from spawning a uvicorn worker until /health/db and /ready first answer 200.
+    """
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env
+    )
+    timings = {}
+    try:
+        while "ready_s" not in timings:
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn exited")
+            if time.perf_counter() - start > 60:
+                raise RuntimeError("worker not ready after 60 s")
+            for key, path in (("accepting_s", "/health/db"), ("ready_s", "/ready")):
+                if key in timings:
+                    continue
+                try:
+                    if httpx.get(f"http://127.0.0.1:{port}{path}", timeout=1).status_code == 200:
+                        timings[key] = round(time.perf_counter() - start, 3)
+                except httpx.TransportError:
+                    break
+            time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait()
+    return timings
+
+
+def main(runs: int, top: int, port: int, max_import_ms: float = None) -> int:
+    tmp = tempfile.mkdtemp()
+    env = bench_env(tmp)
+
+    totals, packages = [], defaultdict(list)
+    for _ in range(runs):
+        total, by_package = import_profile(env)
+        totals.append(total)
+        for name, ms in by_package.items():
+            packages[name].append(ms)
+    heaviest = sorted(((name, statistics.median(ms)) for name, ms in packages.items()), key=lambda p: -p[1])[:top]
+
+    workers = [worker_startup(env, port) for _ in range(runs)]
+    import_ms = statistics.median(totals)
+    print(json.dumps({
+        "runs": runs,
+        "import_api_main_ms": {"p50": round(import_ms, 1), "min": round(min(totals), 1), "max": round(max(totals), 1)},
+        "import_self_ms_by_package": {name: round(ms, 1) for name, ms in heaviest},
+        "worker_accepting_s_p50": statistics.median(w["accepting_s"] for w in workers),
+        "worker_ready_s_p50": statistics.median(w["ready_s"] for w in workers),
+    }, indent=2))
+
+    if max_import_ms is not None and import_ms > max_import_ms:
+        print(f"import api.main took {import_ms:.0f} ms, budget {max_import_ms:.0f} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="packages listed in the import breakdown")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--max-import-ms", type=float, help="fail when the median import time exceeds this")
+    args = parser.parse_args()
+    sys.exit(main(args.runs, args.top, args.port, args.max_import_ms))
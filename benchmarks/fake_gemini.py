@@ -0,0 +1,115 @@
+import asyncio
+import random
+import time
+
+from google.genai import errors, types
+
+
+def _prompt_chars(contents) -> int:
+    if isinstance(contents, list):
+        return sum(len(part.text or "") for content in contents for part in content.parts)
+    return len(str(contents))
+
+
+def _usage(contents, output: str) -> types.GenerateContentResponseUsageMetadata:
+    # Rough token counts (~4 characters per token), enough to exercise usage reporting
+    prompt_tokens = _prompt_chars(contents) // 4 + 1
+    return types.GenerateContentResponseUsageMetadata(
+        prompt_token_count=prompt_tokens,
+        candidates_token_count=len(output) // 4 + 1,
+        total_token_count=prompt_tokens + len(output) // 4 + 1
+    )
+
+
+def _text_response(text: str, contents=None) -> types.GenerateContentResponse:
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(
+            content=types.Content(role="model", parts=[types.Part.from_text(text=text)])
+        )],
+        usage_metadata=_usage(contents, text)
+    )
+
+
+def _audio_response(pcm: bytes) -> types.GenerateContentResponse:
+    return types.GenerateContentResponse(
+        candidates=[types.Candidate(
+            content=types.Content(role="model", parts=[
+                types.Part(inline_data=types.Blob(data=pcm, mime_type="audio/pcm"))
+            ])
+        )]
+    )
+
+
+def _fake_response(model: str, contents=None) -> types.GenerateContentResponse:
+    if "tts" in model:
+        # Silence at 24kHz / 16-bit mono, ~60ms per character like real speech
+        return _audio_response(b"\x00\x00" * 1440 * max(len(str(contents)), 1))
+    if "lite" in model:
+        return _text_response("Soybean Sowing Window", contents)
+    return _text_response("* Sow soybean in the first two weeks of June.\n* Use 75 kg seed per hectare.", contents)
+
+
+class _FailureInjector:
+    def __init__(self, failure_rate: float, seed=None):
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self.failures = 0
+
+    def maybe_fail(self):
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            self.failures += 1
+            raise errors.ServerError(503, {"error": {"code": 503, "message": "Injected failure", "status": "UNAVAILABLE"}})
+
+
+class FakeModels:
+    def __init__(self, latency: float, failures: _FailureInjector):
+        self.latency = latency
+        self.failures = failures
+
+    def generate_content(self, *, model, contents, config=None):
+        time.sleep(self.latency)
+        self.failures.maybe_fail()
+        return _fake_response(model, contents)
+
+
+class FakeAsyncModels:
+    def __init__(self, latency: float, failures: _FailureInjector):
+        self.latency = latency
+        self.failures = failures
+
+    async def generate_content(self, *, model, contents, config=None):
+        # TTS takes longer for longer text, like the real model
+        scale = max(len(contents) / 250, 0.2) if "tts" in model else 1
+        await asyncio.sleep(self.latency * scale)
+        self.failures.maybe_fail()
+        return _fake_response(model, contents)
+
+    async def generate_content_stream(self, *, model, contents, config=None):
+        # The full text arrives word by word, spread evenly over `latency`
+        words = _fake_response(model).text.split(" ")
+
+        async def stream():
+            for i, word in enumerate(words):
+                await asyncio.sleep(self.latency / len(words))
+                # Injected failures can hit mid-stream, after some words were sent
+                self.failures.maybe_fail()
+                yield _text_response(word if i == 0 else f" {word}", contents)
+
+        return stream()
+
+
+class FakeAio:
+    def __init__(self, latency: float, failures: _FailureInjector):
+        self.models = FakeAsyncModels(latency, failures)
+
+
+class FakeClient:
+    """
+    Stand-in for genai.Client. Every call sleeps for `latency` seconds and returns a canned response.
+    With `failure_rate` > 0, that fraction of calls (or stream chunks) raises a 503 ServerError.
+    """
+
+    def __init__(self, latency: float = 1.0, failure_rate: float = 0.0, seed=None):
+        self.failures = _FailureInjector(failure_rate, seed)
+        self.models = FakeModels(latency, self.failures)
+        self.aio = FakeAio(latency, self.failures)
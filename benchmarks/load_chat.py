@@ -0,0 +1,108 @@
+"""
+Load test for POST /chat/{session_id}/message against a stubbed Gemini client.
+
+Compares the async handler (client.aio + semaphore) with the old threadpool-bound
+shape (plain `def` handler calling the blocking client), and measures how long a
+cheap endpoint (/users/{id}) takes while the chats are in flight.
+
+    python -m benchmarks.load_chat --requests 200 --latency 1.0
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/bench.db")
+os.environ.setdefault("TTS_CACHE_DIR", f"{_tmp}/tts_cache")
+os.environ.setdefault("GEMINI_API_KEY", "bench")
+# Fresh SQLite file: let the app create the tables on startup
+os.environ.setdefault("DB_AUTO_CREATE", "true")
+# One user drives every request here; the per-user limits would cap the run
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+from fastapi import Depends
+from sqlalchemy.orm import Session
+
+from api import llm, schemas
+from api.main import app
+from benchmarks.fake_gemini import FakeClient
+from db.database import get_sync_db
+from db.models import ChatMessage
+
+
+@app.post("/bench/sync-chat/{session_id}")
+def sync_chat(session_id: int, request: schemas.MessageCreateSchema, db: Session = Depends(get_sync_db)):
+    db.add(ChatMessage(session_id=session_id, role="user", content=request.content))
+    db.commit()
+    response = llm.client.models.generate_content(model="gemini-3-flash-preview", contents=request.content)
+    db.add(ChatMessage(session_id=session_id, role="model", content=response.text))
+    db.commit()
+    return {"content": response.text}
+
+
+async def _timed(coro):
+    start = time.perf_counter()
+    response = await coro
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def run_mode(client: httpx.AsyncClient, path: str, user_id: int, n: int) -> dict:
+    # One session per request, like n farmers chatting at once
+    session_ids = []
+    for _ in range(n):
+        session = await client.post("/chat/sessions", params={"user_id": user_id}, json={"title": "Bench"})
+        session_ids.append(session.json()["id"])
+
+    async def probe():
+        await asyncio.sleep(0.1)
+        return [await _timed(client.get(f"/users/{user_id}")) for _ in range(5)]
+
+    start = time.perf_counter()
+    chats = [
+        _timed(client.post(path.format(session_id=session_id), params={"user_id": user_id},
+                           json={"content": "When should I sow soybean?"}))
+        for session_id in session_ids
+    ]
+    probe_task = asyncio.create_task(probe())
+    latencies = await asyncio.gather(*chats)
+    elapsed = time.perf_counter() - start
+    probes = await probe_task
+
+    return {
+        "requests": n,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(n / elapsed, 1),
+        "chat_p50_s": round(statistics.median(latencies), 3),
+        "chat_max_s": round(max(latencies), 3),
+        "users_probe_max_s": round(max(probes), 3),
+    }
+
+
+async def main(n: int, latency: float):
+    llm.client = FakeClient(latency=latency)
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        verify = await client.post("/auth/verify-otp", json={"phone_number": "9876543210", "otp": "123456"})
+        user_id = verify.json()["user_id"]
+
+        results = {
+            "latency_s": latency,
+            "threadpool": await run_mode(client, "/bench/sync-chat/{session_id}", user_id, n),
+            "async": await run_mode(client, "/chat/{session_id}/message", user_id, n),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=1.0, help="stubbed Gemini latency in seconds")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.latency))
@@ -0,0 +1,82 @@
+"""
+Time-to-first-byte for POST /chat/{session_id}/message vs. its SSE variant
+/chat/{session_id}/message/stream, against a stubbed Gemini client.
+
+    python -m benchmarks.ttfb_chat --runs 20 --latency 8.0
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/bench.db")
+os.environ.setdefault("TTS_CACHE_DIR", f"{_tmp}/tts_cache")
+os.environ.setdefault("GEMINI_API_KEY", "bench")
+# Fresh SQLite file: let the app create the tables on startup
+os.environ.setdefault("DB_AUTO_CREATE", "true")
+# One user drives every request here; the per-user limits would cap the run
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import threading
+
+import httpx
+import uvicorn
+
+from api import llm
+from api.main import app
+from benchmarks.fake_gemini import FakeClient
+
+
+async def ttfb(client: httpx.AsyncClient, path: str, user_id: int) -> tuple[float, float]:
+    start = time.perf_counter()
+    first = None
+    async with client.stream("POST", path, params={"user_id": user_id},
+                             json={"content": "How do I treat pink bollworm?"}) as response:
+        response.raise_for_status()
+        async for _ in response.aiter_bytes():
+            if first is None:
+                first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def start_server(port: int) -> uvicorn.Server:
+    # A real socket is needed: httpx's ASGITransport buffers the whole body
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def main(runs: int, latency: float, port: int):
+    llm.client = FakeClient(latency=latency)
+    server = start_server(port)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+        verify = await client.post("/auth/verify-otp", json={"phone_number": "9876543210", "otp": "123456"})
+        user_id = verify.json()["user_id"]
+
+        results = {"latency_s": latency}
+        for name, path in (("blocking", "/chat/{}/message"), ("sse", "/chat/{}/message/stream")):
+            samples = []
+            for _ in range(runs):
+                session = await client.post("/chat/sessions", params={"user_id": user_id}, json={"title": "Bench"})
+                samples.append(await ttfb(client, path.format(session.json()["id"]), user_id))
+            results[name] = {
+                "ttfb_p50_s": round(statistics.median(s[0] for s in samples), 3),
+                "total_p50_s": round(statistics.median(s[1] for s in samples), 3),
+            }
+    server.should_exit = True
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=8.0, help="stubbed full-generation time in seconds")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    asyncio.run(main(args.runs, args.latency, args.port))
@@ -0,0 +1,91 @@
+"""
+Time to first audio byte for GET /chat/message/{id}/tts vs. the sentence-chunked
+/chat/message/{id}/tts/stream, against a stubbed Gemini client whose TTS latency
+grows with text length.
+
+    python -m benchmarks.ttfb_tts --runs 5 --latency 2.0 --sentences 40
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/bench.db")
+os.environ.setdefault("TTS_CACHE_DIR", f"{_tmp}/tts_cache")
+os.environ.setdefault("GEMINI_API_KEY", "bench")
+# Fresh SQLite file: let the app create the tables on startup
+os.environ.setdefault("DB_AUTO_CREATE", "true")
+# One user drives every request here; the per-user limits would cap the run
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+
+from api import llm
+from benchmarks.fake_gemini import FakeClient
+from benchmarks.ttfb_chat import start_server
+from db.database import SessionLocal
+from db.models import ChatMessage
+
+SENTENCE = "Apply 50 kg urea per acre in two split doses after the first irrigation."
+
+
+def add_answer(session_id: int, sentences: int, run: int) -> int:
+    # A distinct text per run so the audio cache never hits
+    with SessionLocal() as db:
+        msg = ChatMessage(session_id=session_id, role="model", content=f"Run {run}. " + " ".join([SENTENCE] * sentences))
+        db.add(msg)
+        db.commit()
+        return msg.id
+
+
+async def first_audio(client: httpx.AsyncClient, path: str, user_id: int) -> tuple[float, float, int]:
+    start = time.perf_counter()
+    first = None
+    size = 0
+    async with client.stream("GET", path, params={"user_id": user_id}) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes():
+            if first is None:
+                first = time.perf_counter() - start
+            size += len(chunk)
+    return first, time.perf_counter() - start, size
+
+
+async def main(runs: int, latency: float, sentences: int, port: int):
+    llm.client = FakeClient(latency=latency)
+    server = start_server(port)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+        verify = await client.post("/auth/verify-otp", json={"phone_number": "9876543210", "otp": "123456"})
+        user_id = verify.json()["user_id"]
+        session = await client.post("/chat/sessions", params={"user_id": user_id}, json={"title": "Bench"})
+        session_id = session.json()["id"]
+
+        results = {"latency_s_per_250_chars": latency, "chars": len(SENTENCE) * sentences}
+        run = 0
+        for name, path in (("single", "/chat/message/{}/tts"), ("stream", "/chat/message/{}/tts/stream")):
+            samples = []
+            for _ in range(runs):
+                run += 1
+                message_id = add_answer(session_id, sentences, run)
+                samples.append(await first_audio(client, path.format(message_id), user_id))
+            results[name] = {
+                "first_audio_p50_s": round(statistics.median(s[0] for s in samples), 3),
+                "total_p50_s": round(statistics.median(s[1] for s in samples), 3),
+                "bytes": samples[0][2],
+            }
+    server.should_exit = True
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=2.0, help="stubbed TTS seconds per 250 characters")
+    parser.add_argument("--sentences", type=int, default=40)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+    asyncio.run(main(args.runs, args.latency, args.sentences, args.port))
@@ -1,6 +1,11 @@
-from sqlalchemy import create_engine
+from functools import partial
+from typing import Protocol
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+import anyio
 import os
 
 
@@ -11,23 +16,218 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
 if SQLALCHEMY_DATABASE_URL and SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
     SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-# 3. Create the Engine
+# Pool settings (per worker process)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# SQLite tuning
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+
+# The schema is managed by Alembic. DB_AUTO_CREATE=true creates missing tables on startup
+# (development, or a fresh SQLite file before `alembic stamp head`).
+DB_AUTO_CREATE = os.getenv("DB_AUTO_CREATE", "false").lower() == "true"
+
+# The endpoints run on asyncpg on Postgres. On SQLite they keep the sync Session and run each
+# unit of work in the threadpool: a pysqlite call takes microseconds, and aiosqlite's hand-off
+# of every DBAPI call to its own thread halved chat throughput. DB_ASYNC_DRIVER=true|false overrides.
+DB_ASYNC_DRIVER = os.getenv(
+    "DB_ASYNC_DRIVER", "false" if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else "true"
+).lower() == "true"
+
+# 3. Create the Engines
 #    (We remove the manual quote_plus/password logic because it's already in the URL)
+#    `engine` (sync) serves Alembic, the background workers and the CLIs, and the endpoints on
+#    SQLite; `async_engine` (asyncpg / aiosqlite) serves the endpoints when DB_ASYNC_DRIVER is on.
+# asyncpg takes `ssl` where libpq takes `sslmode` (same values), and rejects libpq-only
+# parameters (connect_timeout, application_name, sslrootcert, ...) with a TypeError on connect
+ASYNCPG_URL_PARAMS = {"ssl", "prepared_statement_cache_size"}
+
+
+def _async_url(url: str) -> str:
+    if url.startswith("sqlite"):
+        return make_url(url).set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+
+    parsed = make_url(url)
+    query = dict(parsed.query)
+    if "sslmode" in query:
+        query.setdefault("ssl", query.pop("sslmode"))
+    dropped = sorted(set(query) - ASYNCPG_URL_PARAMS)
+    if dropped:
+        print(f"DATABASE_URL parameters not supported by asyncpg, ignored for the endpoints: {', '.join(dropped)}"
+              " (set ASYNC_DATABASE_URL to configure the async engine directly)")
+    query = {name: value for name, value in query.items() if name in ASYNCPG_URL_PARAMS}
+    return parsed.set(drivername="postgresql+asyncpg", query=query).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or (_async_url(SQLALCHEMY_DATABASE_URL) if DB_ASYNC_DRIVER else None)
+
+
+# WAL lets readers run alongside the single writer, so several uvicorn workers
+# can share the file without "database is locked" errors
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    # Off by default in SQLite; deleting a user or session relies on ON DELETE CASCADE
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
 if "sqlite" in SQLALCHEMY_DATABASE_URL:
+    in_memory = ":memory:" in SQLALCHEMY_DATABASE_URL or SQLALCHEMY_DATABASE_URL.rstrip("/") == "sqlite:"
+    pool_args = {} if in_memory else {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
     engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}, **pool_args
     )
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_args) if DB_ASYNC_DRIVER else None
+
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    if async_engine is not None:
+        event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
 else:
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    pool_args = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, **pool_args)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_args) if DB_ASYNC_DRIVER else None
+
+# The sync Engine behind the endpoints' sessions (for event listeners and pool stats)
+endpoint_engine = engine if async_engine is None else async_engine.sync_engine
+
+
+class EndpointSession(Protocol):
+    """
+    The session surface the endpoints may use (get_db): the AsyncSession methods ThreadpoolSession
+    implements as well. Annotate with this rather than AsyncSession, so a call only AsyncSession
+    has (get, delete, merge, stream, ...) fails the type check instead of failing on SQLite at runtime.
+    """
+
+    async def run_sync(self, fn, *args, **kwargs): ...
+
+    async def execute(self, statement, params=None, **kwargs): ...
+
+    async def scalar(self, statement, params=None, **kwargs): ...
+
+    async def scalars(self, statement, params=None, **kwargs): ...
+
+    def add(self, instance) -> None: ...
+
+    async def flush(self) -> None: ...
+
+    async def refresh(self, instance) -> None: ...
+
+    async def commit(self) -> None: ...
+
+    async def rollback(self) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class ThreadpoolSession:
+    """
+    EndpointSession over a sync Session whose calls run in the threadpool. Results are buffered in the thread, as AsyncSession's are, so no row is
+    fetched on the event loop. Multi-statement work goes through run_sync: one hop in all.
+    """
+
+    def __init__(self, session_factory):
+        self.sync_session = session_factory()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await anyio.to_thread.run_sync(partial(fn, self.sync_session, *args, **kwargs))
+
+    async def execute(self, statement, params=None, **kwargs):
+        return await self.run_sync(_buffered_execute, statement, params, **kwargs)
+
+    async def scalar(self, statement, params=None, **kwargs):
+        return (await self.execute(statement, params, **kwargs)).scalar()
+
+    async def scalars(self, statement, params=None, **kwargs):
+        return (await self.execute(statement, params, **kwargs)).scalars()
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    async def flush(self):
+        await self.run_sync(lambda session: session.flush())
+
+    async def refresh(self, instance):
+        await self.run_sync(lambda session: session.refresh(instance))
+
+    async def commit(self):
+        await self.run_sync(lambda session: session.commit())
+
+    async def rollback(self):
+        await self.run_sync(lambda session: session.rollback())
+
+    async def close(self):
+        await self.run_sync(lambda session: session.close())
+
+
+def _buffered_execute(session, statement, params=None, **kwargs):
+    result = session.execute(statement, params, **kwargs)
+    # ORM results always return rows; a Core UPDATE/DELETE result has none to buffer
+    return result.freeze()() if getattr(result, "returns_rows", True) else result
+
 
 # 4. Create Session & Base
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# The endpoints' sessions. Loaded attributes stay usable after commit: an AsyncSession cannot
+# lazily reload them, and on SQLite a reload would run on the event loop.
+if async_engine is not None:
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+else:
+    AsyncSessionLocal = partial(
+        ThreadpoolSession, sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+    )
 Base = declarative_base()
 
-# 5. Dependency
-def get_db():
+# 5. Dependencies
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def pool_status(engine=engine) -> dict:
+    """
+    Connection pool usage for this worker. checked_out near size + max_overflow means the pool is exhausted.
+    """
+    pool = engine.pool
+    stats = {"class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout"):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    if hasattr(pool, "overflow"):
+        # QueuePool counts overflow from -pool_size; only connections beyond pool_size are overflow
+        stats["overflow"] = max(pool.overflow(), 0)
+        stats["max_overflow"] = DB_MAX_OVERFLOW
+    return stats
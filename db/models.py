@@ -1,10 +1,15 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Index, LargeBinary, DDL, bindparam, event, literal_column, select, update
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import datetime
 import pytz
 from db.database import Base
 
+# SQLite stores server_default CURRENT_TIMESTAMP as 'YYYY-MM-DD HH:MM:SS' text. Bind datetimes in the
+# same format so comparisons against created_at (keyset pagination cursors) are exact.
+CreatedAt = DateTime(timezone=True).with_variant(sqlite.DATETIME(truncate_microseconds=True), "sqlite")
+
 def get_ist_time():
     return datetime.datetime.now(pytz.timezone('Asia/Kolkata'))
 
@@ -21,39 +26,166 @@ class User(Base):
     farm_type = Column(String, nullable=True)
 
     is_verified = Column(Boolean, default=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(CreatedAt, server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
-    # Relationships
-    chat_sessions = relationship("ChatSession", back_populates="user", cascade="all, delete-orphan")
+    __table_args__ = (
+        # User list: ORDER BY created_at, id (keyset pagination)
+        Index("ix_users_created_at", "created_at", "id"),
+    )
+
+    # Relationships. Deletes cascade in the database (ON DELETE CASCADE down to the messages):
+    # passive_deletes keeps the ORM from loading the children just to delete them one by one
+    chat_sessions = relationship("ChatSession", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
 
 class OTP(Base):
     __tablename__ = "otp_codes"
 
     id = Column(Integer, primary_key=True, index=True)
-    phone_number = Column(String, index=True, nullable=False)
+    # One code per phone: send-otp upserts on it (see api/otp_store.py)
+    phone_number = Column(String, unique=True, index=True, nullable=False)
     otp_code = Column(String, nullable=False)
-    expires_at = Column(DateTime(timezone=True), nullable=False)
+    # Batched cleanup of expired codes scans by expiry
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
     is_used = Column(Boolean, default=False)
 
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     title = Column(String, default="New Chat") # E.g., "Cotton Disease Info"
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(CreatedAt, server_default=func.now())
+    # Bumped by every UPDATE (title, summary, archiving) but the message counters: part of the
+    # session list ETag (api/http_cache.py)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Rolling summary of the turns that fell out of the prompt window (see api/context.py)
+    summary = Column(Text, nullable=True)
+    summary_upto_id = Column(Integer, nullable=True) # Last ChatMessage.id folded into the summary
+
+    # Set while the messages live packed in chat_session_archives (see api/archive.py)
+    archived_at = Column(DateTime(timezone=True), nullable=True)
+    # Last restore on access: counts as activity, so a session just opened is not packed again
+    rehydrated_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Session overview (GET /chat/sessions/{user_id}/overview), updated with every new message
+    # (see bump_session_counters below) so listing sessions reads no messages. Archiving and
+    # rehydrating move messages without touching these.
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_message_preview = Column(String, nullable=True)
+    last_message_role = Column(String, nullable=True)
+    last_message_at = Column(CreatedAt, nullable=True)
+    # Newest message, or the session's creation until it has one
+    last_activity_at = Column(CreatedAt, default=func.now())
+
+    __table_args__ = (
+        # Session list: WHERE user_id = ? ORDER BY created_at DESC
+        Index("ix_chat_sessions_user_id_created_at", "user_id", "created_at", "id"),
+        # Session overview: WHERE user_id = ? ORDER BY last_activity_at DESC
+        Index("ix_chat_sessions_user_id_last_activity_at", "user_id", "last_activity_at", "id"),
+    )
 
     user = relationship("User", back_populates="chat_sessions")
-    messages = relationship("ChatMessage", back_populates="session", cascade="all, delete-orphan")
+    messages = relationship("ChatMessage", back_populates="session", cascade="all, delete-orphan", passive_deletes=True)
+    archive = relationship("ChatSessionArchive", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
 
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey("chat_sessions.id"), nullable=False)
+    session_id = Column(Integer, ForeignKey("chat_sessions.id", ondelete="CASCADE"), nullable=False)
     role = Column(String, nullable=False) # 'user' or 'model'
     content = Column(Text, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(CreatedAt, server_default=func.now())
+
+    __table_args__ = (
+        # History: WHERE session_id = ? ORDER BY created_at, id
+        Index("ix_chat_messages_session_id_created_at", "session_id", "created_at", "id"),
+        # Search (Postgres): to_tsvector('simple', content) @@ query
+        Index(
+            "ix_chat_messages_content_tsv",
+            func.to_tsvector(literal_column("'simple'"), content),
+            postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+    )
+
+    session = relationship("ChatSession", back_populates="messages")
+
+# --- Session overview counters ---
+MESSAGE_PREVIEW_CHARS = 120
+
+
+def message_preview(content: str) -> str:
+    text = " ".join(content.split())
+    return text if len(text) <= MESSAGE_PREVIEW_CHARS else text[:MESSAGE_PREVIEW_CHARS - 1] + "…"
+
+
+_message_created_at = select(ChatMessage.created_at).where(ChatMessage.id == bindparam("message_id")).scalar_subquery()
+# Built once: the hook runs for every message, and building the statement cost more than running it
+_bump_session_counters = (
+    update(ChatSession)
+    .where(ChatSession.id == bindparam("target_session_id"))
+    .values(
+        message_count=ChatSession.message_count + 1,
+        last_message_preview=bindparam("preview"),
+        last_message_role=bindparam("role"),
+        last_message_at=_message_created_at,
+        last_activity_at=_message_created_at,
+        # Set to itself so onupdate does not fire: the session list (and its ETag) did not change
+        updated_at=ChatSession.updated_at,
+    )
+)
+
+
+def bump_session_counters(mapper, connection, target):
+    # Runs in the flush that inserts the message, in the same transaction. Only ORM inserts get
+    # here: Core inserts (archive rehydrate, benchmark seeding) restore rows already counted.
+    connection.execute(_bump_session_counters, {
+        "target_session_id": target.session_id,
+        "message_id": target.id,
+        "preview": message_preview(target.content),
+        "role": target.role,
+    })
+
+
+event.listen(ChatMessage, "after_insert", bump_session_counters)
+
+# --- Full-text search over message content (see api/search.py) ---
+# Postgres: the GIN index in ChatMessage.__table_args__.
+# SQLite: FTS5 table keyed by message id, kept in sync by triggers. `owner` holds "u<user_id>" so a
+# search is narrowed to one user inside the index. M* keeps Devanagari vowel signs inside words.
+SEARCH_FTS_TABLE = "chat_messages_fts"
+SQLITE_SEARCH_DDL = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_FTS_TABLE} USING fts5(
+        content, owner, tokenize="unicode61 remove_diacritics 2 categories 'L* N* Co M*'"
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS chat_messages_fts_insert AFTER INSERT ON chat_messages BEGIN
+        INSERT INTO {SEARCH_FTS_TABLE} (rowid, content, owner)
+        SELECT new.id, new.content, 'u' || user_id FROM chat_sessions WHERE id = new.session_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS chat_messages_fts_delete AFTER DELETE ON chat_messages BEGIN
+        DELETE FROM {SEARCH_FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS chat_messages_fts_update AFTER UPDATE OF content ON chat_messages BEGIN
+        UPDATE {SEARCH_FTS_TABLE} SET content = new.content WHERE rowid = new.id;
+    END""",
+)
+
+for _statement in SQLITE_SEARCH_DDL:
+    event.listen(ChatMessage.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+# The triggers go with chat_messages; the FTS table would otherwise outlive it with stale rows
+event.listen(ChatMessage.__table__, "before_drop",
+             DDL(f"DROP TABLE IF EXISTS {SEARCH_FTS_TABLE}").execute_if(dialect="sqlite"))
+
+class ChatSessionArchive(Base):
+    """
+    Cold storage for an inactive session: all its messages as one zlib-compressed JSON blob.
+    """
+    __tablename__ = "chat_session_archives"
 
-    session = relationship("ChatSession", back_populates="messages")
\ No newline at end of file
+    session_id = Column(Integer, ForeignKey("chat_sessions.id", ondelete="CASCADE"), primary_key=True)
+    message_count = Column(Integer, nullable=False)
+    raw_bytes = Column(Integer, nullable=False)
+    blob = Column(LargeBinary, nullable=False)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())